@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'usuarios.metricas.MetricasMiddleware',  # primero: mide la petición completa
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -54,7 +55,7 @@ ROOT_URLCONF = 'gestion_hotel.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'usuarios.metricas.PlantillasDjango',  # DjangoTemplates que mide el render
         'DIRS': [],  # Aquí puedes agregar rutas adicionales para buscar plantillas si es necesario
         'APP_DIRS': True,  # Permite buscar en las carpetas 'templates' de las aplicaciones
         'OPTIONS': {
@@ -74,12 +75,61 @@ WSGI_APPLICATION = 'gestion_hotel.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'OrquideaSuite',
+# Perfil elegido por variables de entorno: DB_MOTOR=sqlite (por defecto, el
+# archivo OrquideaSuite) o DB_MOTOR=postgresql para varias cajas y la oficina.
+DB_MOTOR = os.environ.get('DB_MOTOR', 'sqlite')
+
+# Segundos que se reutiliza una conexión entre peticiones (0 = una por petición)
+DB_CONEXION_SEGUNDOS = int(os.environ.get('DB_CONEXION_SEGUNDOS', 60))
+
+if DB_MOTOR == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NOMBRE', 'orquidea'),
+            'USER': os.environ.get('DB_USUARIO', 'orquidea'),
+            'PASSWORD': os.environ.get('DB_CLAVE', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PUERTO', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'CONN_MAX_AGE': DB_CONEXION_SEGUNDOS,
+        }
+    }
+    if os.environ.get('DB_POOL_MAXIMO'):
+        # Pool de psycopg (pip install "psycopg[pool]"); el pool reutiliza las
+        # conexiones, así que Django exige CONN_MAX_AGE = 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MINIMO', 2)),
+                'max_size': int(os.environ['DB_POOL_MAXIMO']),
+                'timeout': int(os.environ.get('DB_POOL_ESPERA', 10)),
+            },
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NOMBRE', BASE_DIR / 'OrquideaSuite'),
+            'CONN_MAX_AGE': DB_CONEXION_SEGUNDOS,
+            'OPTIONS': {
+                # BEGIN IMMEDIATE: la transacción toma el bloqueo de escritura al
+                # empezar y espera busy_timeout, en vez de fallar con "database is
+                # locked" al pasar de lectura a escritura a mitad de una venta
+                'transaction_mode': 'IMMEDIATE',
+                # El modo WAL (las lecturas no esperan a la escritura en curso)
+                # queda guardado en el archivo: lo activa una sola vez la
+                # migración 0017_sqlite_wal. Aquí solo van los PRAGMA de cada
+                # conexión; con WAL, synchronous=NORMAL no arriesga la base ante
+                # un corte del proceso
+                'init_command': (
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_ESPERA_MS', 5000))};"
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024))};"
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -103,6 +153,59 @@ AUTH_PASSWORD_VALIDATORS = [
 # Configuración de los mensajes
 MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 
+# Tasa de IVA aplicada a las ventas (los totales se calculan en el servidor)
+IVA_TASA = '0.19'
+
+# Índice en memoria de códigos de barras (usuarios/indice_codigos.py)
+INDICE_CODIGOS_CALENTAR = True  # precargar al arrancar wsgi/asgi
+INDICE_CODIGOS_REVISION = 5  # segundos entre lecturas de los productos que cambiaron otros procesos
+
+# Caché en disco de los PDF de factura (usuarios/facturas_pdf.py)
+FACTURAS_PDF_DIR = BASE_DIR / 'cache' / 'facturas'
+FACTURAS_PDF_PRERENDER = True  # renderizar en segundo plano al guardar la venta
+
+# Cola de trabajos en segundo plano (usuarios/trabajos.py, manage.py procesar_trabajos)
+REPORTES_DIR = BASE_DIR / 'cache' / 'reportes'
+REPORTES_PDF_CONCURRENTES = 2  # renders de PDF simultáneos como máximo
+TRABAJOS_TIEMPO_MAXIMO = 900  # segundos antes de devolver a la cola un trabajo colgado
+
+# Métricas por petición (usuarios/metricas.py): IP que pueden leer /metrics sin sesión de staff
+METRICAS_IPS = ('127.0.0.1', '::1')
+
+# Informe de ingresos memorizado por rango (usuarios/ingresos.py); se invalida al escribir una Factura
+INFORME_INGRESOS_TTL = 3600
+
+# Cachés: el HTML de los fragmentos de plantilla (usuarios/fragmentos.py) puede ir
+# en memoria de cada proceso o en disco; sus números de versión van siempre en
+# 'versiones', en disco, para que una escritura atendida por un trabajador de
+# gunicorn invalide los fragmentos de todos. La de informes (usuarios/ingresos.py)
+# también va en disco para que todos vean la misma versión
+CACHE_FRAGMENTOS = os.environ.get('CACHE_FRAGMENTOS', 'memoria')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragmentos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_FRAGMENTOS_DIR', BASE_DIR / 'cache' / 'fragmentos'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    } if CACHE_FRAGMENTOS == 'archivo' else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragmentos',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_VERSIONES_DIR', BASE_DIR / 'cache' / 'versiones'),
+    },
+    'informes': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_INFORMES_DIR', BASE_DIR / 'cache' / 'informes'),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+FRAGMENTOS_TTL = 600  # segundos; las versiones de catálogo y ventas ya descartan lo que cambió
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion_hotel.settings')
 
 application = get_wsgi_application()
+
+# Precargar el índice de códigos de barras para el escáner de la caja
+from usuarios.indice_codigos import calentar_al_iniciar  # noqa: E402
+
+calentar_al_iniciar()
@@ -1,4 +1,16 @@
 from django.contrib import admin
-from .models import Producto
+from . import movimientos
+from .models import Producto, ProductoProveedor
 
-admin.site.register(Producto)
\ No newline at end of file
+
+@admin.register(Producto)
+class ProductoAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        # Las ediciones de stock desde el admin también quedan en el libro de movimientos
+        if change:
+            movimientos.guardar_con_ajuste(obj)
+        else:
+            super().save_model(request, obj, form, change)
+
+
+admin.site.register(ProductoProveedor)
@@ -0,0 +1,751 @@
+# usuarios/benchmarks.py
+"""
+Escenarios de rendimiento que se ejecutan con `python manage.py benchmark`.
+
+Cada escenario corre sobre una base de datos temporal (la misma que usan las
+pruebas), así que nunca toca los datos reales de OrquideaSuite.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from .models import Producto
+
+ESCENARIOS = {}
+
+
+def escenario(nombre, archivo=False):
+    """
+    Registra una función como escenario de benchmark. Con `archivo` la base
+    temporal de SQLite se crea en disco (WAL y bloqueos reales entre hilos).
+    """
+    def decorador(func):
+        func.archivo = archivo
+        ESCENARIOS[nombre] = func
+        return func
+    return decorador
+
+
+@contextmanager
+def base_temporal(archivo=False):
+    """Crea una base de datos de pruebas para el benchmark y la elimina al terminar."""
+    nombre_original = connection.settings_dict['NAME']
+    prueba = connection.settings_dict['TEST']
+    nombre_prueba = prueba.get('NAME')
+    if archivo and connection.vendor == 'sqlite' and not nombre_prueba:
+        prueba['NAME'] = os.path.join(tempfile.gettempdir(), f'benchmark_{os.getpid()}.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        prueba['NAME'] = nombre_prueba
+
+
+def medir(func, repeticiones, preparar=None):
+    """Ejecuta `func` varias veces y devuelve las latencias en milisegundos."""
+    tiempos = []
+    for i in range(repeticiones):
+        argumento = preparar(i) if preparar else None
+        inicio = time.perf_counter()
+        func(argumento)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def resumen(tiempos):
+    """Calcula media, p50 y p99 de una lista de latencias."""
+    ordenados = sorted(tiempos)
+    p99 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))]
+    return {
+        'n': len(ordenados),
+        'media_ms': round(statistics.mean(ordenados), 3),
+        'p50_ms': round(statistics.median(ordenados), 3),
+        'p99_ms': round(p99, 3),
+    }
+
+
+def crear_productos(cantidad, stock=1_000_000, prefijo='BENCH'):
+    """Crea productos sintéticos en bloque y los devuelve."""
+    Producto.objects.bulk_create([
+        Producto(
+            codigo=f"{prefijo}{i:07d}",
+            nombre=f"Producto {i}",
+            stock=stock,
+            categoria=f"Categoria {i % 25}",
+            precio=1000 + (i % 500),
+        )
+        for i in range(cantidad)
+    ], batch_size=1000)
+    return list(Producto.objects.filter(codigo__startswith=prefijo).order_by('id'))
+
+
+def crear_ventas(productos, lineas, dias=365, lineas_por_venta=4, lote=5000):
+    """
+    Crea ventas y detalles sintéticos repartidos en los últimos `dias` días.
+
+    Usa bulk_create por lotes y no pasa por procesar_venta, así que no toca el
+    stock ni los resúmenes (reconstruirlos después si hacen falta).
+    """
+    import random
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from .models import DetalleVenta, Venta
+
+    aleatorio = random.Random(7)
+    ahora = timezone.now()
+    ventas_totales = max(1, lineas // lineas_por_venta)
+    creadas = 0
+    while creadas < ventas_totales:
+        n = min(lote, ventas_totales - creadas)
+        ventas = Venta.objects.bulk_create([
+            Venta(subtotal=0, iva=0, total=0, cajero='benchmark', caja='1')
+            for _ in range(n)
+        ])
+        detalles = []
+        for venta in ventas:
+            venta.fecha = ahora - timedelta(days=aleatorio.randrange(dias), seconds=aleatorio.randrange(86400))
+            subtotal = 0
+            for producto in aleatorio.sample(productos, lineas_por_venta):
+                cantidad = aleatorio.randint(1, 5)
+                subtotal += producto.precio * cantidad
+                detalles.append(DetalleVenta(
+                    venta=venta, producto=producto, cantidad=cantidad,
+                    precio_unitario=producto.precio, subtotal=producto.precio * cantidad,
+                ))
+            venta.subtotal = venta.total = subtotal
+        Venta.objects.bulk_update(ventas, ['fecha', 'subtotal', 'total'])
+        DetalleVenta.objects.bulk_create(detalles, batch_size=lote)
+        creadas += n
+    return creadas
+
+
+def usuario_benchmark():
+    usuario, _ = User.objects.get_or_create(username='benchmark')
+    return usuario
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def _venta_por_linea(carrito, usuario, totales):
+    """Réplica del guardar_venta anterior: una consulta, un INSERT y un save por línea."""
+    from .models import Venta, DetalleVenta
+
+    venta = Venta.objects.create(
+        subtotal=totales['subtotal'], iva=totales['iva'], total=totales['total'],
+        cajero=usuario.username, vendedor=usuario.username, caja='1',
+    )
+    for linea in carrito:
+        producto = Producto.objects.get(id=linea['id'])
+        DetalleVenta.objects.create(
+            venta=venta, producto=producto, cantidad=linea['cantidad'],
+            precio_unitario=linea['precio'], subtotal=linea['subtotal'],
+        )
+        producto.stock -= linea['cantidad']
+        producto.save()
+    return venta
+
+
+@escenario('checkout')
+def benchmark_checkout(repeticiones=30, tamanos=(1, 5, 10, 20, 40)):
+    """Latencia por venta según el tamaño del carrito: procesar_venta vs. una consulta por línea."""
+    from .ventas import procesar_venta
+
+    usuario = usuario_benchmark()
+    productos = crear_productos(max(tamanos))
+    resultados = []
+
+    for tamano in tamanos:
+        carrito = [
+            {'id': p.id, 'cantidad': 1, 'precio': str(p.precio), 'subtotal': str(p.precio)}
+            for p in productos[:tamano]
+        ]
+        subtotal = sum(p.precio for p in productos[:tamano])
+        totales = {'subtotal': subtotal, 'iva': 0, 'total': subtotal}
+
+        modos = (
+            ('por_linea', lambda _: _venta_por_linea(carrito, usuario, totales)),
+            ('conjunto', lambda _: procesar_venta(carrito, usuario)),
+        )
+        for modo, func in modos:
+            tiempos = medir(func, repeticiones)
+            resultados.append({
+                'escenario': 'checkout', 'modo': modo, 'tamano_carrito': tamano, **resumen(tiempos),
+            })
+
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def _buscar_sin_indice(request):
+    """Réplica de buscar_producto_por_codigo antes del índice: consulta y JSON por escaneo."""
+    from django.http import JsonResponse
+
+    producto = Producto.objects.get(codigo=request.GET['codigo'])
+    return JsonResponse({
+        'id': producto.id,
+        'nombre': producto.nombre,
+        'precio': producto.precio,
+        'stock': producto.stock,
+        'codigo': producto.codigo,
+    })
+
+
+@escenario('escaneo')
+def benchmark_escaneo(repeticiones=30, catalogo=20000):
+    """Latencia p50/p99 de un escaneo de código de barras con y sin índice en memoria."""
+    import random
+
+    from django.test import RequestFactory
+
+    from .indice_codigos import indice
+    from .views import buscar_producto_por_codigo
+
+    productos = crear_productos(catalogo)
+    usuario = usuario_benchmark()
+    fabrica = RequestFactory()
+    aleatorio = random.Random(42)
+    escaneos = max(repeticiones * 50, 1000)
+
+    def preparar(_):
+        request = fabrica.get('/api/buscar_producto/', {'codigo': aleatorio.choice(productos).codigo})
+        request.user = usuario
+        return request
+
+    indice.limpiar()
+    resultados = [{
+        'escenario': 'escaneo', 'modo': 'sin_indice', 'catalogo': catalogo,
+        **resumen(medir(_buscar_sin_indice, escaneos, preparar)),
+    }]
+
+    inicio = time.perf_counter()
+    indice.calentar()
+    calentamiento_ms = round((time.perf_counter() - inicio) * 1000, 3)
+    resultados.append({
+        'escenario': 'escaneo', 'modo': 'con_indice', 'catalogo': catalogo,
+        **resumen(medir(buscar_producto_por_codigo, escaneos, preparar)),
+        'calentamiento_ms': calentamiento_ms,
+        'tasa_aciertos': indice.estadisticas()['tasa_aciertos'],
+    })
+    indice.limpiar()
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+@escenario('busqueda')
+def benchmark_busqueda(repeticiones=30, tamanos=(10000, 100000)):
+    """Búsqueda de productos: LIKE (icontains) frente al índice FTS5 según el tamaño del catálogo."""
+    from django.db.models import Q
+
+    from . import busqueda
+
+    terminos = ('produ 12', 'categoria 7', 'BENCH00042', 'inexistente')
+    resultados = []
+    creados = 0
+
+    for tamano in sorted(tamanos):
+        Producto.objects.bulk_create([
+            Producto(
+                codigo=f"BENCH{i:07d}", nombre=f"Producto {i} cuadérno", stock=10,
+                categoria=f"Categoria {i % 25}", precio=1000,
+            )
+            for i in range(creados, tamano)
+        ], batch_size=2000)
+        creados = tamano
+
+        for termino in terminos:
+            def like(_):
+                list(Producto.objects.filter(
+                    Q(codigo__icontains=termino) | Q(nombre__icontains=termino) |
+                    Q(categoria__icontains=termino)
+                )[:50])
+
+            def fts(_):
+                list(busqueda.buscar(Producto.objects.all(), termino)[:50])
+
+            for modo, func in (('like', like), ('fts5', fts)):
+                resultados.append({
+                    'escenario': 'busqueda', 'modo': modo, 'productos': tamano,
+                    'termino': termino, **resumen(medir(func, repeticiones)),
+                })
+
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def _indicadores_sin_resumenes(desde, hasta):
+    """Réplica de los cálculos de reportes antes de los resúmenes precalculados."""
+    from django.db.models import Sum
+
+    from .models import DetalleVenta, Venta
+
+    Venta.objects.count()
+    DetalleVenta.objects.values('producto__nombre').annotate(t=Sum('cantidad')).order_by('-t').first()
+    DetalleVenta.objects.values('producto__nombre').annotate(t=Sum('cantidad')).order_by('t').first()
+    list(
+        DetalleVenta.objects.filter(venta__fecha__date__gte=desde, venta__fecha__date__lte=hasta)
+        .values('producto__nombre').annotate(t=Sum('cantidad')).order_by('-t')
+    )
+
+
+def _indicadores_con_resumenes(desde, hasta):
+    from . import resumenes
+
+    resumenes.total_ventas()
+    list(resumenes.ranking_productos())
+    list(resumenes.ranking_productos(desde, hasta))
+
+
+@escenario('reportes')
+def benchmark_reportes(repeticiones=30, lineas=200000, productos=2000):
+    """Indicadores del tablero de reportes: agregando DetalleVenta frente a leer los resúmenes."""
+    from django.utils import timezone
+
+    from . import resumenes
+
+    crear_ventas(crear_productos(productos), lineas)
+    inicio = time.perf_counter()
+    resumenes.reconstruir()
+    reconstruccion_ms = round((time.perf_counter() - inicio) * 1000, 3)
+
+    hoy = timezone.localdate()
+    desde, hasta = resumenes.rango_mes(hoy.year, hoy.month)
+    repeticiones = max(3, repeticiones // 5)
+    return [
+        {'escenario': 'reportes', 'modo': 'detalle_venta', 'lineas': lineas,
+         **resumen(medir(lambda _: _indicadores_sin_resumenes(desde, hasta), repeticiones))},
+        {'escenario': 'reportes', 'modo': 'resumenes', 'lineas': lineas,
+         **resumen(medir(lambda _: _indicadores_con_resumenes(desde, hasta), repeticiones)),
+         'reconstruccion_ms': reconstruccion_ms},
+    ]
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+@escenario('exportacion')
+def benchmark_exportacion(repeticiones=3, tamanos=(1000, 100000), productos=500):
+    """Exportación CSV/XLSX de DetalleVenta: tiempo y pico de memoria según el número de filas."""
+    import tracemalloc
+
+    from . import exportacion
+
+    catalogo = crear_productos(productos)
+    filas = []
+    creadas = 0
+    for lineas in tamanos:
+        crear_ventas(catalogo, lineas - creadas)
+        creadas = lineas
+        for formato in ('csv', 'xlsx'):
+            def exportar(_, formato=formato):
+                if formato == 'csv':
+                    for _ in exportacion.csv_en_streaming():
+                        pass
+                else:
+                    exportacion.xlsx_en_archivo().close()
+
+            tracemalloc.start()
+            exportar(None)
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            filas.append({
+                'escenario': 'exportacion', 'formato': formato, 'lineas': lineas,
+                **resumen(medir(exportar, repeticiones)), 'pico_mb': round(pico / 2**20, 2),
+            })
+    return filas
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+@escenario('facturas')
+def benchmark_facturas(repeticiones=30, lineas=8):
+    """Latencia de generar_factura_pdf con la caché en disco vacía (frío) y llena (caliente)."""
+    import tempfile
+
+    from django.test import RequestFactory, override_settings
+
+    from . import facturas_pdf
+    from .ventas import procesar_venta
+    from .views import generar_factura_pdf
+
+    productos = crear_productos(lineas)
+    usuario = usuario_benchmark()
+    venta = procesar_venta([{'id': p.id, 'cantidad': 1} for p in productos], usuario)
+    fabrica = RequestFactory()
+
+    def pedir(_):
+        request = fabrica.get(f'/factura/{venta.id}/pdf/')
+        request.user = usuario
+        respuesta = generar_factura_pdf(request, venta.id)
+        b''.join(respuesta.streaming_content)
+        respuesta.close()
+
+    with tempfile.TemporaryDirectory() as directorio, override_settings(FACTURAS_PDF_DIR=directorio):
+        frio = medir(pedir, repeticiones, preparar=lambda _: facturas_pdf.limpiar())
+        pedir(None)
+        caliente = medir(pedir, repeticiones)
+    return [
+        {'escenario': 'facturas', 'modo': 'frio', 'lineas': lineas, **resumen(frio)},
+        {'escenario': 'facturas', 'modo': 'caliente', 'lineas': lineas, **resumen(caliente)},
+    ]
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+@escenario('importacion')
+def benchmark_importacion(repeticiones=1, filas=200000):
+    """Importación masiva del catálogo: carga inicial y lista de precios sobre los mismos códigos."""
+    import tempfile
+
+    from .importacion import importar
+
+    def archivo_csv(columnas, fila):
+        archivo = tempfile.TemporaryFile()
+        archivo.write((columnas + '\n').encode())
+        for i in range(filas):
+            archivo.write((fila(i) + '\n').encode())
+        archivo.seek(0)
+        return archivo
+
+    resultados = []
+    for modo, columnas, fila in (
+        ('catalogo', 'codigo,nombre,categoria,precio,stock', lambda i: f"IMP{i:08d},Producto {i},Categoría {i % 50},{i % 9000 + 100}.50,{i % 300}"),
+        ('precios', 'codigo,precio', lambda i: f"IMP{i:08d},{i % 7000 + 200}.00"),
+    ):
+        with archivo_csv(columnas, fila) as archivo:
+            inicio = time.perf_counter()
+            resultado = importar(archivo, 'catalogo.csv')
+            segundos = time.perf_counter() - inicio
+        resultados.append({
+            'escenario': 'importacion', 'modo': modo, 'filas': filas,
+            'segundos': round(segundos, 2), 'filas_por_segundo': round(filas / segundos),
+            'creados': resultado.creados, 'actualizados': resultado.actualizados,
+        })
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def crear_estadias(cantidad, habitaciones=100, dias=365, lote=5000, facturar=True):
+    """
+    Crea reservas y sus facturas sintéticas con bulk_create (sin calendario de
+    ocupación ni señales), repartidas en los últimos `dias` días. Con
+    facturar=False quedan las reservas sin factura.
+    """
+    import random
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from .models import Cliente, Factura, Habitacion, Reserva
+
+    aleatorio = random.Random(11)
+    usuario = usuario_benchmark()
+    cliente = Cliente.objects.create(nombre_cliente='Benchmark', telefono='0', direccion='-', usuario=usuario)
+    cuartos = Habitacion.objects.bulk_create([
+        Habitacion(numero=f'B{n:04d}', tipo='doble', capacidad=2, precio_por_noche=100000 + n * 1000)
+        for n in range(habitaciones)
+    ])
+    hoy = timezone.localdate()
+    creadas = 0
+    while creadas < cantidad:
+        n = min(lote, cantidad - creadas)
+        reservas = []
+        for _ in range(n):
+            inicio = hoy - timedelta(days=aleatorio.randrange(dias))
+            reservas.append(Reserva(
+                cliente=cliente, habitacion=aleatorio.choice(cuartos), estado_reserva='reservada',
+                fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=aleatorio.randint(1, 6)),
+            ))
+        Reserva.objects.bulk_create(reservas)
+        creadas += n
+        if not facturar:
+            continue
+        Factura.objects.bulk_create([
+            Factura(
+                usuario=usuario, reserva=r, noches=(r.fecha_fin - r.fecha_inicio).days,
+                precio_por_noche=r.habitacion.precio_por_noche,
+                total=r.habitacion.precio_por_noche * (r.fecha_fin - r.fecha_inicio).days,
+                fecha_inicio=r.fecha_inicio, fecha_fin=r.fecha_fin,
+            )
+            for r in reservas
+        ])
+    return creadas
+
+
+def _ingresos_por_reserva(desde, hasta):
+    """Réplica del informe anterior: JOIN con la reserva y total en Python por día."""
+    from django.db.models import Sum
+
+    from .models import Factura
+
+    facturas = Factura.objects.filter(reserva__fecha_inicio__gte=desde, reserva__fecha_fin__lte=hasta)
+    total = facturas.aggregate(Sum('total'))['total__sum']
+    list(facturas.select_related('reserva__habitacion'))
+    return total
+
+
+@escenario('ingresos')
+def benchmark_ingresos(repeticiones=30, facturas=100000):
+    """Informe de ingresos de un año: JOIN con Reserva, agregado sobre Factura y resultado memorizado."""
+    from datetime import timedelta
+
+    from django.core.cache import caches
+    from django.utils import timezone
+
+    from . import ingresos
+
+    crear_estadias(facturas)
+    hasta = timezone.localdate() + timedelta(days=7)
+    desde = hasta - timedelta(days=372)
+    repeticiones = max(3, repeticiones // 5)
+
+    def sin_cache(_):
+        caches[ingresos.ALIAS].clear()
+        ingresos.informe(desde, hasta, 'semana')
+
+    return [
+        {'escenario': 'ingresos', 'modo': 'join_reserva', 'facturas': facturas,
+         **resumen(medir(lambda _: _ingresos_por_reserva(desde, hasta), repeticiones))},
+        {'escenario': 'ingresos', 'modo': 'agregado', 'facturas': facturas,
+         **resumen(medir(sin_cache, repeticiones))},
+        {'escenario': 'ingresos', 'modo': 'memorizado', 'facturas': facturas,
+         **resumen(medir(lambda _: ingresos.informe(desde, hasta, 'semana'), repeticiones * 10))},
+    ]
+
+
+def _facturar_una_por_una(desde, hasta):
+    """Réplica de generar_factura aplicada a cada reserva: get_or_create por fila."""
+    from .facturacion import pendientes
+    from .models import Factura
+
+    for reserva in pendientes(desde, hasta).select_related('habitacion', 'cliente'):
+        noches = (reserva.fecha_fin - reserva.fecha_inicio).days
+        precio_noche = reserva.habitacion.precio_por_noche if reserva.habitacion else 0
+        Factura.objects.get_or_create(reserva=reserva, defaults={
+            'usuario_id': reserva.cliente.usuario_id, 'noches': noches,
+            'precio_por_noche': precio_noche, 'total': noches * precio_noche,
+        })
+
+
+@escenario('facturacion')
+def benchmark_facturacion(repeticiones=3, reservas=20000):
+    """Cierre nocturno: facturar todas las reservas pendientes una por una y por lotes."""
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from .facturacion import facturar_reservas
+    from .models import Factura
+
+    crear_estadias(reservas, facturar=False)
+    hasta = timezone.localdate() + timedelta(days=7)
+    desde = hasta - timedelta(days=372)
+
+    def borrar_facturas(_):
+        Factura.objects.all().delete()
+
+    return [
+        {'escenario': 'facturacion', 'modo': modo, 'reservas': reservas,
+         **resumen(medir(lambda _: funcion(desde, hasta), repeticiones, preparar=borrar_facturas))}
+        for modo, funcion in (('una_por_una', _facturar_una_por_una), ('lotes', facturar_reservas))
+    ]
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+# Opciones de conexión de SQLite que se comparan con las de settings.DATABASES
+PERFILES_SQLITE = {
+    'anterior': {'init_command': 'PRAGMA journal_mode=DELETE'},  # diario clásico y BEGIN diferido
+}
+
+
+@escenario('escritores', archivo=True)
+def benchmark_escritores(repeticiones=30, cajas=(1, 4, 8), lineas=5, productos=200):
+    """Cajas simultáneas llamando a guardar_venta: ventas por segundo, latencia y errores por perfil de base."""
+    import json
+    import random
+    import threading
+
+    from django.db import connections
+    from django.test import RequestFactory, override_settings
+
+    from .views import guardar_venta
+
+    catalogo = [p.id for p in crear_productos(productos)]
+    usuario = usuario_benchmark()
+    fabrica = RequestFactory()
+    opciones = connection.settings_dict['OPTIONS']
+    perfiles = {'configurado': opciones}
+    if connection.vendor == 'sqlite':
+        # journal_mode queda guardado en el archivo: después del perfil
+        # anterior se vuelve a WAL, como lo deja la migración 0017_sqlite_wal
+        configurado = {**opciones, 'init_command': 'PRAGMA journal_mode=WAL;' + opciones.get('init_command', '')}
+        perfiles = {**PERFILES_SQLITE, 'configurado': configurado}
+
+    def caja(numero, barrera, latencias, errores):
+        aleatorio = random.Random(numero)
+        try:
+            barrera.wait()
+            for _ in range(repeticiones):
+                cuerpo = json.dumps({'productos': [
+                    {'id': i, 'cantidad': 1} for i in aleatorio.sample(catalogo, lineas)
+                ]})
+                request = fabrica.post('/guardar_venta/', cuerpo, content_type='application/json')
+                request.user = usuario
+                inicio = time.perf_counter()
+                respuesta = guardar_venta(request)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != 200:
+                    errores.append(json.loads(respuesta.content)['message'])
+        finally:
+            connections.close_all()
+
+    resultados = []
+    try:
+        for perfil, opciones_perfil in perfiles.items():
+            # Cada hilo abre su propia conexión con las opciones del perfil
+            connection.close()
+            connection.settings_dict['OPTIONS'] = opciones_perfil
+            connection.ensure_connection()
+            for cantidad in (cajas if isinstance(cajas, tuple) else (cajas,)):
+                latencias, errores = [], []
+                barrera = threading.Barrier(cantidad)
+                hilos = [
+                    threading.Thread(target=caja, args=(n, barrera, latencias, errores))
+                    for n in range(cantidad)
+                ]
+                inicio = time.perf_counter()
+                with override_settings(FACTURAS_PDF_PRERENDER=False):
+                    for hilo in hilos:
+                        hilo.start()
+                    for hilo in hilos:
+                        hilo.join()
+                segundos = time.perf_counter() - inicio
+                resultados.append({
+                    'escenario': 'escritores', 'motor': connection.vendor, 'perfil': perfil, 'cajas': cantidad,
+                    'ventas_por_segundo': round((len(latencias) - len(errores)) / segundos, 1),
+                    'errores': len(errores), **resumen(latencias),
+                })
+                if errores:
+                    resultados[-1]['primer_error'] = errores[0]
+    finally:
+        connection.close()
+        connection.settings_dict['OPTIONS'] = opciones
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def generar_datos(productos=2000, lineas=50000, reservas=5000):
+    """
+    Datos sintéticos de la tienda y del hotel a la escala indicada: catálogo,
+    ventas con sus líneas (y los resúmenes de reportes), reservas y facturas.
+    """
+    from . import resumenes
+
+    catalogo = crear_productos(productos)
+    crear_ventas(catalogo, lineas)
+    resumenes.reconstruir()
+    crear_estadias(reservas)
+    return catalogo
+
+
+@escenario('vistas')
+def benchmark_vistas(repeticiones=30, productos=2000, lineas=50000, reservas=5000):
+    """Latencia y consultas de las vistas de la caja y de reportes, pedidas con el cliente de pruebas."""
+    import json
+    import random
+
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from . import facturas_pdf
+    from .models import Venta
+
+    catalogo = generar_datos(productos, lineas, reservas)
+    venta_id = Venta.objects.order_by('-id').values_list('id', flat=True).first()
+    aleatorio = random.Random(5)
+    cliente = Client()
+    cliente.force_login(usuario_benchmark())
+
+    def pedir(metodo, url, *args, **kwargs):
+        respuesta = getattr(cliente, metodo)(url, *args, **kwargs)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"{url} respondió {respuesta.status_code}")
+        if respuesta.streaming:
+            b''.join(respuesta.streaming_content)
+        return respuesta
+
+    def carrito(_):
+        return json.dumps({'productos': [{'id': p.id, 'cantidad': 1} for p in aleatorio.sample(catalogo, 3)]})
+
+    # vista: (petición con el argumento de preparar, preparar)
+    vistas = {
+        'guardar_venta': (
+            lambda cuerpo: pedir('post', reverse('guardar_venta'), cuerpo, content_type='application/json'),
+            carrito,
+        ),
+        'buscar_producto_por_codigo': (
+            lambda codigo: pedir('get', reverse('buscar_producto_codigo'), {'codigo': codigo}),
+            lambda _: aleatorio.choice(catalogo).codigo,
+        ),
+        'listar_todos_los_productos_api': (lambda _: pedir('get', reverse('listar_productos_api')), None),
+        'reportes': (lambda _: pedir('get', reverse('reportes')), None),
+        # Sin caché en disco: el peor caso, la primera impresión de la factura
+        'generar_factura_pdf': (
+            lambda _: pedir('get', reverse('generar_factura_pdf', args=[venta_id])),
+            lambda _: facturas_pdf.limpiar(),
+        ),
+        'gestionar_inventario': (lambda _: pedir('get', reverse('inventario')), None),
+    }
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio, override_settings(
+        ALLOWED_HOSTS=['*'], FACTURAS_PDF_DIR=directorio, FACTURAS_PDF_PRERENDER=False,
+    ):
+        for vista, (func, preparar) in vistas.items():
+            with CaptureQueriesContext(connection) as consultas:
+                func(preparar(None) if preparar else None)
+            resultados.append({
+                'escenario': 'vistas', 'vista': vista, 'productos': productos, 'lineas': lineas,
+                'consultas': len(consultas), **resumen(medir(func, repeticiones, preparar)),
+            })
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+# Comparación de resultados guardados (manage.py benchmark --json / --comparar)
+MEDIDAS = {'n', 'errores', 'primer_error', 'consultas', 'tasa_aciertos', 'creados', 'actualizados'}
+SUFIJOS_MEDIDA = ('_ms', '_mb', '_por_segundo', 'segundos')
+
+
+def es_medida(campo):
+    return campo in MEDIDAS or campo.endswith(SUFIJOS_MEDIDA)
+
+
+def clave(fila):
+    """Identifica una fila de resultados por sus campos que no son medidas (escenario, modo, tamaños...)."""
+    return tuple(sorted((campo, str(valor)) for campo, valor in fila.items() if not es_medida(campo)))
+
+
+def comparar(actuales, base, tolerancia=0.25, margen_ms=1.0):
+    """
+    Regresiones de `actuales` frente a `base`: p50 más de `tolerancia` por
+    encima de la base (y al menos `margen_ms`, para no fallar por ruido en
+    operaciones de microsegundos) o más consultas SQL que antes.
+    """
+    anteriores = {clave(fila): fila for fila in base}
+    regresiones = []
+    for fila in actuales:
+        anterior = anteriores.get(clave(fila))
+        if anterior is None:
+            continue
+        nombre = ' '.join(f"{c}={v}" for c, v in clave(fila))
+        if 'p50_ms' in fila and 'p50_ms' in anterior:
+            antes, ahora = anterior['p50_ms'], fila['p50_ms']
+            if ahora > antes * (1 + tolerancia) and ahora - antes >= margen_ms:
+                regresiones.append(f"{nombre}: p50 {antes} -> {ahora} ms")
+        if 'consultas' in fila and 'consultas' in anterior and fila['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} -> {fila['consultas']}")
+    return regresiones
@@ -0,0 +1,128 @@
+# usuarios/busqueda.py
+"""
+Búsqueda de productos con un índice SQLite FTS5.
+
+La tabla virtual usuarios_producto_fts usa usuarios_producto como contenido
+externo y se mantiene sincronizada con triggers, así que también ve los
+bulk_create y los UPDATE hechos con querysets. El tokenizador unicode61 con
+remove_diacritics ignora tildes ("cuaderno" encuentra "Cuadérno") y los
+índices de prefijo aceleran el autocompletado. En motores sin FTS5 se usa la
+búsqueda icontains de siempre.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'usuarios_producto_fts'
+
+SQL_INDICE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+        codigo, nombre, categoria,
+        content='usuarios_producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS usuarios_producto_fts_ai AFTER INSERT ON usuarios_producto BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, categoria)
+        VALUES (new.id, new.codigo, new.nombre, new.categoria);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS usuarios_producto_fts_ad AFTER DELETE ON usuarios_producto BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, codigo, nombre, categoria)
+        VALUES ('delete', old.id, old.codigo, old.nombre, old.categoria);
+    END""",
+    # Solo cuando cambian las columnas indexadas: los descuentos de stock no tocan el índice
+    f"""CREATE TRIGGER IF NOT EXISTS usuarios_producto_fts_au
+        AFTER UPDATE OF codigo, nombre, categoria ON usuarios_producto BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, codigo, nombre, categoria)
+        VALUES ('delete', old.id, old.codigo, old.nombre, old.categoria);
+        INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, categoria)
+        VALUES (new.id, new.codigo, new.nombre, new.categoria);
+    END""",
+]
+
+SQL_ELIMINAR = [
+    "DROP TRIGGER IF EXISTS usuarios_producto_fts_ai",
+    "DROP TRIGGER IF EXISTS usuarios_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS usuarios_producto_fts_au",
+    f"DROP TABLE IF EXISTS {TABLA_FTS}",
+]
+
+
+def disponible(conexion=None):
+    return (conexion or connection).vendor == 'sqlite'
+
+
+def instalar(conexion, reconstruir=False, solo_triggers=False):
+    """
+    Crea (si no existe) la tabla FTS y sus triggers.
+
+    Es idempotente: la migración 0005 crea el índice y, tras cada migrate, se
+    vuelve a llamar con `solo_triggers` porque cuando SQLite reconstruye
+    usuarios_producto para alterar columnas los triggers se pierden.
+    """
+    if not disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [TABLA_FTS])
+        existia = cursor.fetchone() is not None
+        if solo_triggers and not existia:
+            return
+        for sentencia in SQL_INDICE:
+            cursor.execute(sentencia)
+        if reconstruir or not existia:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+
+
+def eliminar(conexion):
+    if not disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        for sentencia in SQL_ELIMINAR:
+            cursor.execute(sentencia)
+
+
+def consulta_fts(termino):
+    """Convierte lo que escribe el usuario en una consulta FTS5 de prefijos: "cuad"* "azul"*."""
+    palabras = re.findall(r'\w+', termino or '')
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar(productos, termino, incluir_id=False):
+    """
+    Filtra un queryset de Producto por `termino` y lo ordena por relevancia.
+
+    Es la única API de búsqueda de productos: la usan listar_productos,
+    gestionar_inventario y buscar_productos. Con `incluir_id` un término
+    numérico también encuentra el producto con ese id (sin ordenar por
+    relevancia).
+    """
+    termino = (termino or '').strip()
+    if not termino:
+        return productos
+
+    extra = Q(id=int(termino)) if incluir_id and termino.isdigit() else Q()
+
+    consulta = consulta_fts(termino)
+    if not disponible() or not consulta:
+        return productos.filter(
+            Q(codigo__icontains=termino) |
+            Q(nombre__icontains=termino) |
+            Q(categoria__icontains=termino) |
+            extra
+        )
+
+    if extra:
+        # MATCH no se puede combinar con OR: el id exacto se une como subconsulta
+        coincidencias = RawSQL(f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [consulta])
+        return productos.filter(Q(id__in=coincidencias) | extra)
+
+    # JOIN con la tabla FTS: SQLite parte de las coincidencias del índice y
+    # busca cada producto por su clave primaria
+    return productos.extra(
+        tables=[TABLA_FTS],
+        where=[f"{TABLA_FTS}.rowid = usuarios_producto.id", f"{TABLA_FTS} MATCH %s"],
+        params=[consulta],
+        select={'rango': f"{TABLA_FTS}.rank"},
+        order_by=['rango'],
+    )
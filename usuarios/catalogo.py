@@ -0,0 +1,116 @@
+# usuarios/catalogo.py
+"""
+Catálogo de productos paginado por cursor para las cajas.
+
+Las filas se recorren en orden (actualizado, id), así que un producto que se
+modifica a mitad de la descarga vuelve a aparecer más adelante en lugar de
+perderse. Con `updated_since` solo se devuelven los productos modificados (y
+los eliminados) desde esa fecha menos MARGEN_COMMIT: stock.descontar, auto_now
+y ProductoEliminado fijan la hora antes del commit, así que una escritura puede
+hacerse visible después de una fecha_servidor posterior a su hora. Repetir
+esos segundos en cada sincronización solo reenvía unas pocas filas.
+
+El ETag lleva además la versión 'catalogo' de fragmentos.py, que cambia al
+confirmar cada escritura de Producto: dos escrituras confirmadas en desorden
+no cambian el conteo ni el Max(actualizado), pero sí la versión.
+"""
+import base64
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import fragmentos
+from .models import Producto, ProductoEliminado
+
+CAMPOS = ('id', 'codigo', 'nombre', 'precio', 'stock', 'actualizado')
+LIMITE_POR_DEFECTO = 500
+LIMITE_MAXIMO = 2000
+MARGEN_COMMIT = timedelta(seconds=5)
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def leer_fecha(valor):
+    try:
+        fecha = parse_datetime(valor) if valor else None
+    except ValueError:
+        fecha = None
+    if valor and fecha is None:
+        raise ParametroInvalido(f"Fecha inválida: {valor}")
+    if fecha is not None and timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, dt_timezone.utc)
+    return fecha
+
+
+def codificar_cursor(actualizado, producto_id):
+    texto = f"{actualizado.isoformat()}|{producto_id}"
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    try:
+        fecha, producto_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return leer_fecha(fecha), int(producto_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ParametroInvalido("Cursor inválido.")
+
+
+def leer_limite(valor):
+    try:
+        limite = int(valor) if valor else LIMITE_POR_DEFECTO
+    except ValueError:
+        raise ParametroInvalido("El límite debe ser un número.")
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def version_catalogo(desde=None):
+    """Huella del estado del catálogo (para el ETag): dos consultas agregadas y la versión compartida."""
+    productos = Producto.objects.all()
+    eliminados = ProductoEliminado.objects.all()
+    if desde:
+        productos = productos.filter(actualizado__gte=desde - MARGEN_COMMIT)
+        eliminados = eliminados.filter(eliminado__gte=desde - MARGEN_COMMIT)
+    p = productos.aggregate(n=Count('id'), ultimo=Max('actualizado'))
+    e = eliminados.aggregate(n=Count('id'), ultimo=Max('eliminado'))
+    return f"{p['n']}:{p['ultimo']}:{e['n']}:{e['ultimo']}:{fragmentos.version(fragmentos.CATALOGO)}"
+
+
+def etag_pagina(parametros, version):
+    huella = hashlib.sha1(f"{version}|{parametros}".encode()).hexdigest()
+    return f'"{huella}"'
+
+
+def pagina(desde=None, cursor=None, limite=LIMITE_POR_DEFECTO):
+    """
+    Devuelve (productos, siguiente_cursor, eliminados).
+
+    Los eliminados solo se envían en la primera página de una sincronización
+    incremental (cuando hay `desde` y no hay cursor).
+    """
+    productos = Producto.objects.order_by('actualizado', 'id')
+    if desde:
+        productos = productos.filter(actualizado__gte=desde - MARGEN_COMMIT)
+    if cursor:
+        actualizado, producto_id = decodificar_cursor(cursor)
+        productos = productos.filter(
+            Q(actualizado__gt=actualizado) | Q(actualizado=actualizado, id__gt=producto_id)
+        )
+
+    filas = list(productos.values(*CAMPOS)[:limite + 1])
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1]['actualizado'], filas[-1]['id'])
+
+    eliminados = []
+    if desde and not cursor:
+        eliminados = list(
+            ProductoEliminado.objects.filter(eliminado__gte=desde - MARGEN_COMMIT)
+            .values_list('producto_id', flat=True)
+        )
+    return filas, siguiente, eliminados
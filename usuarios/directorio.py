@@ -0,0 +1,176 @@
+# usuarios/directorio.py
+"""
+Directorio de proveedores: búsqueda por prefijo, páginas por clave e importación.
+
+El directorio se ordena por (nombre_clave, id), el nombre en minúsculas y sin
+tildes, con su propio índice. La búsqueda es por prefijo del nombre o del NIT
+y se escribe como un rango (>= prefijo y < prefijo + U+10FFFF) en lugar de
+LIKE, para que use el índice de cada columna tanto en SQLite como en
+PostgreSQL. Las páginas se piden por cursor (paginacion.py), así que la última
+página de una cadena con decenas de miles de proveedores cuesta lo mismo que
+la primera.
+
+La importación lee el archivo igual que la de productos (importacion.leer_filas)
+y guarda cada bloque con un único bulk_create(update_conflicts=True) por NIT.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from . import paginacion
+from .importacion import ErrorFila, Resultado, leer_filas, normalizar
+from .models import Proveedor
+from .stock import con_reintentos
+
+ORDEN = ['nombre_clave', 'id']
+CAMPOS = ('id', 'nombre', 'nit', 'telefono', 'correo', 'direccion')
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+COLUMNAS = ('nit', 'nombre', 'telefono', 'correo', 'direccion')
+OBLIGATORIAS_NUEVOS = ('nombre', 'telefono')
+LONGITUDES = {'nit': 20, 'nombre': 100, 'telefono': 20, 'correo': 100, 'direccion': 255}
+TAMANO_BLOQUE = 2000
+MAXIMO_ERRORES = 1000
+
+# Mayor que cualquier carácter: cierra el rango de la búsqueda por prefijo
+ULTIMO_CARACTER = '\U0010ffff'
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def clave(nombre):
+    """'  Papelería  Central ' -> 'papeleria central'."""
+    return re.sub(r'\s+', ' ', normalizar(nombre))
+
+
+def _prefijo(campo, valor):
+    return Q(**{f'{campo}__gte': valor, f'{campo}__lt': valor + ULTIMO_CARACTER})
+
+
+def buscar(termino=''):
+    """Proveedores cuyo nombre o NIT empieza por `termino` (todos si está vacío)."""
+    proveedores = Proveedor.objects.all()
+    termino = (termino or '').strip()
+    if termino:
+        proveedores = proveedores.filter(_prefijo('nombre_clave', clave(termino)) | _prefijo('nit', termino))
+    return proveedores
+
+
+def leer_limite(valor):
+    try:
+        limite = int(valor) if valor else LIMITE_POR_DEFECTO
+    except ValueError:
+        raise ParametroInvalido("El límite debe ser un número.")
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def pagina(termino='', cursor=None, limite=LIMITE_POR_DEFECTO):
+    """(filas como diccionarios de CAMPOS, cursor siguiente) de una página del directorio."""
+    try:
+        filas, siguiente = paginacion.paginar(buscar(termino).values(*CAMPOS, 'nombre_clave'), ORDEN, cursor, limite)
+    except paginacion.CursorInvalido as error:
+        raise ParametroInvalido(str(error))
+    for fila in filas:
+        del fila['nombre_clave']
+    return filas, siguiente
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+# Importación masiva (upsert por NIT)
+
+def validar(fila):
+    """Convierte una fila del archivo en los valores de Proveedor o lanza ValueError."""
+    datos = {}
+    for campo in COLUMNAS:
+        if campo not in fila:
+            continue
+        valor = '' if fila[campo] is None else str(fila[campo]).strip()
+        if len(valor) > LONGITUDES[campo]:
+            raise ValueError(f"{campo} supera {LONGITUDES[campo]} caracteres")
+        datos[campo] = valor
+    if not datos['nit']:
+        raise ValueError("nit vacío")
+    if datos.get('nombre') == '':
+        raise ValueError("nombre vacío")
+    for campo in ('correo', 'direccion'):
+        if datos.get(campo) == '':
+            datos[campo] = None
+    if datos.get('correo'):
+        try:
+            validate_email(datos['correo'])
+        except ValidationError:
+            raise ValueError(f"correo inválido: {datos['correo']}")
+    return datos
+
+
+@con_reintentos
+def _guardar_bloque(validos, columnas, guardar=True):
+    """Upsert de un bloque {nit: (fila, datos)}; devuelve (creados, actualizados, errores)."""
+    with transaction.atomic():
+        existentes = set(Proveedor.objects.filter(nit__in=list(validos)).values_list('nit', flat=True))
+        proveedores, errores = [], []
+        for nit, (numero, datos) in validos.items():
+            if nit not in existentes:
+                faltan = [c for c in OBLIGATORIAS_NUEVOS if not datos.get(c)]
+                if faltan:
+                    errores.append(ErrorFila(numero, nit, f"proveedor nuevo sin {', '.join(faltan)}"))
+                    continue
+            # bulk_create no dispara pre_save: la clave del nombre se calcula aquí
+            proveedores.append(Proveedor(**datos, nombre_clave=clave(datos.get('nombre', ''))))
+
+        if guardar:
+            actualizar = [c for c in columnas if c != 'nit'] + (['nombre_clave'] if 'nombre' in columnas else [])
+            Proveedor.objects.bulk_create(
+                proveedores,
+                update_conflicts=bool(actualizar),
+                ignore_conflicts=not actualizar,
+                unique_fields=['nit'] if actualizar else None,
+                update_fields=actualizar or None,
+            )
+
+    actualizados = sum(1 for p in proveedores if p.nit in existentes)
+    return len(proveedores) - actualizados, actualizados, errores
+
+
+def importar(archivo, nombre, tamano_bloque=TAMANO_BLOQUE, solo_validar=False):
+    """
+    Crea o actualiza proveedores por NIT desde un CSV o XLSX y devuelve un
+    importacion.Resultado. Como en los productos, las columnas que no vienen
+    en el archivo no se tocan y cada bloque va en su propia transacción.
+    """
+    columnas, filas = leer_filas(archivo, nombre, COLUMNAS, clave='nit')
+    creados = actualizados = errores_totales = 0
+    errores = []
+
+    def anotar(nuevos):
+        nonlocal errores_totales
+        errores_totales += len(nuevos)
+        errores.extend(nuevos[:MAXIMO_ERRORES - len(errores)])
+
+    def procesar(bloque):
+        nonlocal creados, actualizados
+        c, a, e = _guardar_bloque(bloque, columnas, guardar=not solo_validar)
+        creados, actualizados = creados + c, actualizados + a
+        anotar(e)
+
+    bloque = {}
+    for numero, fila in filas:
+        try:
+            datos = validar(fila)
+        except ValueError as error:
+            anotar([ErrorFila(numero, str(fila.get('nit') or ''), str(error))])
+            continue
+        bloque[datos['nit']] = (numero, datos)
+        if len(bloque) >= tamano_bloque:
+            procesar(bloque)
+            bloque = {}
+    if bloque:
+        procesar(bloque)
+
+    return Resultado(creados, actualizados, sorted(errores), errores_totales)
@@ -0,0 +1,89 @@
+# usuarios/disponibilidad.py
+"""
+Disponibilidad de habitaciones por rango de fechas.
+
+Cada reserva activa ocupa en OcupacionNoche una fila por noche (de
+fecha_inicio a fecha_fin - 1; el día de salida queda libre). Las señales de
+Reserva mantienen el calendario al guardar, cancelar o borrar, así que saber
+qué habitaciones están libres es una consulta sobre las noches del rango con
+el índice (fecha, habitacion), sin recorrer todas las reservas.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import Habitacion, OcupacionNoche, Reserva
+
+ACTIVA = 'reservada'
+
+
+def noches(inicio, fin):
+    """Fechas de las noches entre inicio (entrada) y fin (salida)."""
+    return [inicio + timedelta(days=n) for n in range((fin - inicio).days)]
+
+
+def ocupa(reserva):
+    return (
+        reserva.estado_reserva == ACTIVA and reserva.habitacion_id is not None
+        and reserva.fecha_inicio and reserva.fecha_fin and reserva.fecha_fin > reserva.fecha_inicio
+    )
+
+
+@transaction.atomic
+def sincronizar(reserva):
+    """Rehace las noches de una reserva (al crearla, cambiarla de fechas o cancelarla)."""
+    OcupacionNoche.objects.filter(reserva=reserva).delete()
+    if ocupa(reserva):
+        OcupacionNoche.objects.bulk_create([
+            OcupacionNoche(habitacion_id=reserva.habitacion_id, fecha=noche, reserva=reserva)
+            for noche in noches(reserva.fecha_inicio, reserva.fecha_fin)
+        ])
+
+
+def ocupadas(inicio, fin):
+    """Subconsulta con los id de habitaciones ocupadas alguna noche del rango."""
+    return OcupacionNoche.objects.filter(fecha__gte=inicio, fecha__lt=fin).values('habitacion_id')
+
+
+def habitaciones_libres(inicio, fin, habitaciones=None):
+    """Habitaciones habilitadas sin ninguna noche ocupada entre inicio y fin."""
+    if habitaciones is None:
+        habitaciones = Habitacion.objects.filter(disponible=True)
+    return habitaciones.exclude(id__in=ocupadas(inicio, fin))
+
+
+def esta_libre(habitacion, inicio, fin, excluir_reserva=None):
+    noches_ocupadas = OcupacionNoche.objects.filter(habitacion=habitacion, fecha__gte=inicio, fecha__lt=fin)
+    if excluir_reserva is not None:
+        noches_ocupadas = noches_ocupadas.exclude(reserva=excluir_reserva)
+    return not noches_ocupadas.exists()
+
+
+def reservas_solapadas(habitacion, inicio, fin):
+    """Reservas activas de la habitación que se cruzan con [inicio, fin) (usa el índice compuesto)."""
+    return Reserva.objects.filter(
+        habitacion=habitacion, estado_reserva=ACTIVA, fecha_inicio__lt=fin, fecha_fin__gt=inicio,
+    )
+
+
+@transaction.atomic
+def reconstruir(tamano_lote=5000):
+    """Vuelve a generar todo el calendario desde las reservas (comando reconstruir_ocupacion)."""
+    OcupacionNoche.objects.all().delete()
+    lote, creadas = [], 0
+    reservas = Reserva.objects.filter(estado_reserva=ACTIVA, habitacion__isnull=False).only(
+        'id', 'habitacion_id', 'fecha_inicio', 'fecha_fin', 'estado_reserva',
+    )
+    for reserva in reservas.iterator(chunk_size=tamano_lote):
+        if not ocupa(reserva):
+            continue
+        lote.extend(
+            OcupacionNoche(habitacion_id=reserva.habitacion_id, fecha=noche, reserva_id=reserva.id)
+            for noche in noches(reserva.fecha_inicio, reserva.fecha_fin)
+        )
+        if len(lote) >= tamano_lote:
+            OcupacionNoche.objects.bulk_create(lote)
+            creadas += len(lote)
+            lote = []
+    OcupacionNoche.objects.bulk_create(lote)
+    return creadas + len(lote)
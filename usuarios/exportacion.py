@@ -0,0 +1,123 @@
+# usuarios/exportacion.py
+"""
+Exportación de ventas y del catálogo a CSV y XLSX con memoria constante.
+
+Las filas se leen con .iterator(chunk_size=...) y se van escribiendo a
+medida que llegan: el CSV sale directamente en un StreamingHttpResponse y el
+XLSX se arma con un libro de openpyxl en modo write_only sobre un archivo
+temporal en disco, que luego se envía por partes.
+"""
+import csv
+import tempfile
+from datetime import datetime, timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DetalleVenta, Producto, Venta
+
+TAMANO_BLOQUE = 2000
+
+COLUMNAS = {
+    'ventas': [
+        ('ID venta', 'id'),
+        ('Fecha', 'fecha'),
+        ('Cajero', 'cajero'),
+        ('Caja', 'caja'),
+        ('Vendedor', 'vendedor'),
+        ('Subtotal', 'subtotal'),
+        ('IVA', 'iva'),
+        ('Total', 'total'),
+    ],
+    'detalles': [
+        ('ID venta', 'venta_id'),
+        ('Fecha', 'fecha'),
+        ('Código', 'codigo'),
+        ('Producto', 'producto'),
+        ('Cantidad', 'cantidad'),
+        ('Precio unitario', 'precio_unitario'),
+        ('Subtotal', 'subtotal'),
+    ],
+    # Mismos encabezados que acepta importacion.py, para poder reimportar el archivo
+    'productos': [
+        ('Código', 'codigo'),
+        ('Nombre', 'nombre'),
+        ('Categoría', 'categoria'),
+        ('Precio', 'precio'),
+        ('Stock', 'stock'),
+    ],
+}
+
+
+class Eco:
+    """Objeto tipo archivo que devuelve lo que se le escribe (para csv.writer en streaming)."""
+
+    def write(self, valor):
+        return valor
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+
+
+def consulta(tipo='detalles', desde=None, hasta=None, producto_id=None):
+    """Queryset de values_list con las columnas de COLUMNAS[tipo] y los filtros aplicados."""
+    if tipo == 'productos':
+        return Producto.objects.order_by('id').values_list(*[campo for _, campo in COLUMNAS[tipo]])
+    if tipo == 'ventas':
+        filas = Venta.objects.order_by('id')
+        campo_fecha = 'fecha'
+        if producto_id:
+            filas = filas.filter(detalles__producto_id=producto_id).distinct()
+    else:
+        filas = DetalleVenta.objects.order_by('id').annotate(
+            fecha=F('venta__fecha'), codigo=F('producto__codigo'), producto_nombre=F('producto__nombre'),
+        )
+        campo_fecha = 'venta__fecha'
+        if producto_id:
+            filas = filas.filter(producto_id=producto_id)
+
+    if desde:
+        filas = filas.filter(**{f"{campo_fecha}__gte": _inicio_del_dia(desde)})
+    if hasta:
+        filas = filas.filter(**{f"{campo_fecha}__lt": _inicio_del_dia(hasta + timedelta(days=1))})
+
+    campos = [campo for _, campo in COLUMNAS[tipo]]
+    if tipo == 'detalles':
+        campos[campos.index('producto')] = 'producto_nombre'
+    return filas.values_list(*campos)
+
+
+def filas(tipo='detalles', **filtros):
+    """Encabezado y filas listas para escribir, leídas por bloques."""
+    yield [titulo for titulo, _ in COLUMNAS[tipo]]
+    campos = [campo for _, campo in COLUMNAS[tipo]]
+    indice_fecha = campos.index('fecha') if 'fecha' in campos else None
+    for fila in consulta(tipo, **filtros).iterator(chunk_size=TAMANO_BLOQUE):
+        fila = list(fila)
+        if indice_fecha is not None:
+            # Fecha local sin zona horaria (Excel no admite fechas con zona)
+            fila[indice_fecha] = timezone.localtime(fila[indice_fecha]).replace(tzinfo=None)
+        yield fila
+
+
+def csv_en_streaming(tipo='detalles', **filtros):
+    escritor = csv.writer(Eco())
+    yield '﻿'  # BOM para que Excel reconozca UTF-8
+    for fila in filas(tipo, **filtros):
+        yield escritor.writerow(fila)
+
+
+def xlsx_en_archivo(tipo='detalles', **filtros):
+    """Escribe el XLSX en un archivo temporal y lo devuelve abierto al inicio."""
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=tipo.capitalize())
+    for fila in filas(tipo, **filtros):
+        hoja.append(fila)
+
+    archivo = tempfile.TemporaryFile(suffix='.xlsx')
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
@@ -0,0 +1,127 @@
+# usuarios/facturas_pdf.py
+"""
+Caché en disco de los PDF de factura de venta.
+
+Una venta no cambia después de guardarse, así que su PDF se renderiza una
+sola vez. Cada archivo se nombra con un hash del id de la venta, sus totales
+y la versión de la plantilla factura_venta.html: si la plantilla cambia o
+auditar_ventas corrige los totales, la clave cambia, el PDF se vuelve a
+generar y los archivos anteriores de esa venta se borran. guardar_venta pide el render en un hilo de fondo en cuanto la venta
+se confirma, de modo que la primera impresión ya lo encuentra hecho.
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+from . import metricas
+from .models import DetalleVenta, Venta
+
+PLANTILLA = 'usuarios/factura_venta.html'
+
+logger = logging.getLogger(__name__)
+
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='facturas-pdf')
+
+
+class ErrorPDF(Exception):
+    pass
+
+
+def directorio():
+    return Path(getattr(settings, 'FACTURAS_PDF_DIR', Path(settings.BASE_DIR) / 'cache' / 'facturas'))
+
+
+@lru_cache(maxsize=None)
+def version_plantilla():
+    """Hash del código fuente de la plantilla (se recalcula al reiniciar el proceso)."""
+    with open(get_template(PLANTILLA).origin.name, 'rb') as archivo:
+        return hashlib.sha256(archivo.read()).hexdigest()[:16]
+
+
+def clave(venta):
+    datos = f"{venta.id}|{venta.subtotal}|{venta.iva}|{venta.total}|{version_plantilla()}"
+    return hashlib.sha256(datos.encode()).hexdigest()[:32]
+
+
+def ruta(venta):
+    return directorio() / f"factura_{venta.id}_{clave(venta)}.pdf"
+
+
+def renderizar(venta):
+    detalles = DetalleVenta.objects.filter(venta=venta).select_related('producto')
+    html = get_template(PLANTILLA).render({'venta': venta, 'detalles': detalles})
+    salida = io.BytesIO()
+    with metricas.medir('pdf'):
+        estado = pisa.CreatePDF(io.BytesIO(html.encode('UTF-8')), dest=salida, encoding='UTF-8')
+    if estado.err:
+        raise ErrorPDF(f"No se pudo generar el PDF de la venta {venta.id}.")
+    return salida.getvalue()
+
+
+def obtener(venta):
+    """Ruta del PDF de la venta, renderizándolo y guardándolo si no está en disco."""
+    destino = ruta(venta)
+    if destino.exists():
+        return destino
+
+    contenido = renderizar(venta)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica: otro hilo o proceso nunca lee un PDF a medias
+    descriptor, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, destino)
+    except BaseException:
+        Path(temporal).unlink(missing_ok=True)
+        raise
+    _borrar_anteriores(destino, venta.id)
+    return destino
+
+
+def _borrar_anteriores(destino, venta_id):
+    """Quita los PDF de la venta con otra clave (plantilla o totales anteriores)."""
+    for anterior in destino.parent.glob(f"factura_{venta_id}_*.pdf"):
+        if anterior != destino:
+            anterior.unlink(missing_ok=True)
+
+
+def _prerenderizar(venta_id):
+    try:
+        venta = Venta.objects.filter(id=venta_id).first()
+        if venta:
+            obtener(venta)
+    except Exception:
+        logger.exception("Falló el pre-render de la factura %s", venta_id)
+    finally:
+        close_old_connections()
+
+
+def prerenderizar(venta_id):
+    """Encola el render del PDF en el hilo de fondo (llamar después del commit)."""
+    if getattr(settings, 'FACTURAS_PDF_PRERENDER', True):
+        return _ejecutor.submit(_prerenderizar, venta_id)
+
+
+def limpiar():
+    shutil.rmtree(directorio(), ignore_errors=True)
+
+
+def _al_cambiar_ajuste(setting, **kwargs):
+    if setting == 'TEMPLATES':
+        version_plantilla.cache_clear()
+
+
+setting_changed.connect(_al_cambiar_ajuste)
@@ -2,6 +2,7 @@
 from django import forms
 from .models import Habitacion
 from .models import Reserva
+from . import disponibilidad
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -83,4 +84,14 @@ class ReservaForm(forms.ModelForm):
         # Validación: que la fecha de fin sea posterior a la de inicio
         if fecha_fin <= fecha_inicio:
             self.add_error('fecha_fin', "La fecha de check-out debe ser posterior a la de check-in.")
+            return cleaned_data
+
+        # Validación: que la habitación no esté reservada en esas fechas
+        # (aviso temprano; la garantía real la da reservas.guardar_reserva)
+        habitacion = cleaned_data.get("habitacion")
+        if habitacion and not disponibilidad.esta_libre(
+            habitacion, fecha_inicio, fecha_fin, excluir_reserva=self.instance.pk
+        ):
+            self.add_error('habitacion', "La habitación ya está reservada en esas fechas.")
+        return cleaned_data
 
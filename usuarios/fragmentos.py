@@ -0,0 +1,121 @@
+# usuarios/fragmentos.py
+"""
+Caché de fragmentos de plantilla (cuerpos de tabla de productos, inventario y ventas).
+
+La etiqueta {% fragmento %} (templatetags/fragmentos.py) guarda el HTML de su
+bloque en la caché 'fragmentos' (settings.CACHES: en memoria o en disco según
+CACHE_FRAGMENTOS). La clave lleva el número de versión de cada fuente de la
+que depende el bloque: 'catalogo' cambia con cada escritura de Producto
+(señales, stock.descontar, importaciones) y 'ventas' con cada escritura de
+Venta. Como en ingresos.py, lo anterior deja de usarse sin tener que borrarlo
+y la caché lo descarta por TTL o por MAX_ENTRIES.
+
+Las versiones se guardan aparte, en la caché 'versiones' (siempre en disco):
+aunque el HTML quede en la memoria de cada trabajador de gunicorn, una
+escritura atendida por cualquiera de ellos cambia la versión que leen todos y
+nadie vuelve a servir el fragmento anterior. Los aciertos y fallos se cuentan
+por fragmento en cada proceso.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+ALIAS = 'fragmentos'
+ALIAS_VERSIONES = 'versiones'
+CATALOGO, VENTAS = 'catalogo', 'ventas'
+FUENTES = (CATALOGO, VENTAS)
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _versiones():
+    return caches[ALIAS_VERSIONES]
+
+
+def version(fuente):
+    clave = f'fragmentos:version:{fuente}'
+    valor = _versiones().get(clave)
+    if valor is None:
+        # Caché reiniciada: arrancar con la hora para no reutilizar versiones guardadas
+        _versiones().add(clave, time.time_ns(), None)
+        valor = _versiones().get(clave)
+    return valor
+
+
+def _cambiar_version(fuente):
+    # Un valor nuevo en lugar de incr(): dos procesos que cambian a la vez no
+    # pueden terminar con el mismo número (el backend en disco no tiene incr atómico)
+    _versiones().set(f'fragmentos:version:{fuente}', time.time_ns(), None)
+
+
+def invalidar(fuente):
+    """
+    Cambia la versión de la fuente ahora y otra vez al confirmar la transacción:
+    lo que otro proceso guarde entre la escritura y el commit, con los datos
+    anteriores, queda también descartado.
+    """
+    _cambiar_version(fuente)
+    transaction.on_commit(lambda: _cambiar_version(fuente))
+
+
+def clave(nombre, fuentes, valores):
+    versiones = ':'.join(f'{fuente}{version(fuente)}' for fuente in fuentes)
+    resumen = hashlib.md5(repr(valores).encode(), usedforsecurity=False).hexdigest()
+    return f'fragmentos:{nombre}:{versiones}:{resumen}'
+
+
+def obtener(nombre, fuentes, valores, renderizar):
+    """HTML del fragmento desde la caché, o renderizado y guardado si no estaba."""
+    clave_fragmento = clave(nombre, fuentes, valores)
+    contenido = _cache().get(clave_fragmento)
+    if contenido is not None:
+        estadisticas.anotar(nombre, acierto=True)
+        return contenido
+    estadisticas.anotar(nombre, acierto=False)
+    contenido = renderizar()
+    _cache().set(clave_fragmento, contenido, getattr(settings, 'FRAGMENTOS_TTL', 600))
+    return contenido
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+class EstadisticasFragmentos:
+    def __init__(self):
+        self._conteos = {}
+        self._candado = threading.Lock()
+
+    def anotar(self, nombre, acierto):
+        with self._candado:
+            conteo = self._conteos.setdefault(nombre, [0, 0])
+            conteo[0 if acierto else 1] += 1
+
+    def limpiar(self):
+        with self._candado:
+            self._conteos.clear()
+
+    def resumen(self):
+        with self._candado:
+            conteos = {nombre: tuple(conteo) for nombre, conteo in self._conteos.items()}
+        por_fragmento = {nombre: _tasa(aciertos, fallos) for nombre, (aciertos, fallos) in sorted(conteos.items())}
+        return {
+            **_tasa(sum(a for a, _ in conteos.values()), sum(f for _, f in conteos.values())),
+            'backend': _cache().__class__.__name__,
+            'fragmentos': por_fragmento,
+        }
+
+
+def _tasa(aciertos, fallos):
+    consultas = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / consultas, 4) if consultas else 0,
+    }
+
+
+estadisticas = EstadisticasFragmentos()
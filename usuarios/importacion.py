@@ -0,0 +1,216 @@
+# usuarios/importacion.py
+"""
+Importación masiva del catálogo de productos desde CSV o XLSX.
+
+El archivo se lee fila a fila (csv.reader u openpyxl en modo read_only)
+y se procesa por bloques de TAMANO_BLOQUE: cada bloque se valida, se consulta
+qué códigos ya existen con una sola consulta y se guarda con un único
+bulk_create(update_conflicts=True) por código. Las filas inválidas no detienen
+la importación; se devuelven con su número de fila y el motivo.
+
+Las columnas que no vienen en el archivo no se tocan, así que una lista de
+precios de proveedor con solo "codigo" y "precio" actualiza los precios sin
+pisar nombres ni stock. Cuando viene "stock", la diferencia con el stock
+anterior de cada producto queda en el libro de movimientos.
+"""
+import csv
+import io
+import unicodedata
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import transaction
+
+from . import fragmentos, movimientos
+from .indice_codigos import indice
+from .models import Producto
+from .stock import con_reintentos
+
+TAMANO_BLOQUE = 2000
+COLUMNAS = ('codigo', 'nombre', 'categoria', 'precio', 'stock')
+OBLIGATORIAS_NUEVOS = ('nombre', 'categoria')
+MAXIMO_ERRORES = 1000
+
+ErrorFila = namedtuple('ErrorFila', ['fila', 'codigo', 'mensaje'])
+Resultado = namedtuple('Resultado', ['creados', 'actualizados', 'errores', 'errores_totales'])
+
+
+class ArchivoInvalido(ValueError):
+    pass
+
+
+def normalizar(encabezado):
+    """'Código ' -> 'codigo'."""
+    texto = unicodedata.normalize('NFKD', str(encabezado or '')).encode('ascii', 'ignore').decode()
+    return texto.strip().lower()
+
+
+def leer_filas(archivo, nombre, columnas_validas=COLUMNAS, clave='codigo'):
+    """
+    Devuelve (columnas, iterador de (numero_fila, dict)) de un CSV o XLSX con
+    las columnas reconocidas; la columna `clave` es obligatoria.
+    """
+    extension = Path(nombre).suffix.lower()
+    if extension == '.csv':
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        lector = csv.reader(texto, delimiter=_separador(texto))
+        encabezado = next(lector, [])
+        filas = ((numero, valores) for numero, valores in enumerate(lector, start=2))
+    elif extension == '.xlsx':
+        from openpyxl import load_workbook
+
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        valores = libro.active.iter_rows(values_only=True)
+        encabezado = next(valores, ())
+        filas = ((numero, fila) for numero, fila in enumerate(valores, start=2))
+    else:
+        raise ArchivoInvalido("El archivo debe ser .csv o .xlsx.")
+
+    columnas = [normalizar(c) for c in encabezado]
+    if clave not in columnas:
+        raise ArchivoInvalido(f"Falta la columna '{clave}'.")
+    posiciones = [(i, c) for i, c in enumerate(columnas) if c in columnas_validas]
+
+    def diccionarios():
+        for numero, fila in filas:
+            if not any(v not in (None, '') for v in fila):
+                continue  # filas vacías al final de las hojas de cálculo
+            yield numero, {c: (fila[i] if i < len(fila) else None) for i, c in posiciones}
+
+    return [c for _, c in posiciones], diccionarios()
+
+
+def _separador(texto):
+    # Excel en español guarda los CSV con ';'
+    muestra = texto.readline()
+    texto.seek(0)
+    return ';' if muestra.count(';') > muestra.count(',') else ','
+
+
+def _texto(valor, campo, maximo):
+    valor = '' if valor is None else str(valor).strip()
+    if len(valor) > maximo:
+        raise ValueError(f"{campo} supera {maximo} caracteres")
+    return valor
+
+
+def validar(fila):
+    """Convierte una fila del archivo en los valores de Producto o lanza ValueError."""
+    datos = {'codigo': _texto(fila['codigo'], 'codigo', 20)}
+    if not datos['codigo']:
+        raise ValueError("codigo vacío")
+    for campo in ('nombre', 'categoria'):
+        if campo in fila:
+            datos[campo] = _texto(fila[campo], campo, 100)
+            if not datos[campo]:
+                raise ValueError(f"{campo} vacío")
+    if 'precio' in fila:
+        try:
+            precio = Decimal(str(fila['precio']).strip().replace(',', '.')).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"precio inválido: {fila['precio']}")
+        if precio < 0 or precio >= Decimal('1e8'):
+            raise ValueError(f"precio fuera de rango: {fila['precio']}")
+        datos['precio'] = precio
+    if 'stock' in fila:
+        try:
+            stock = Decimal(str(fila['stock']).strip())
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"stock inválido: {fila['stock']}")
+        if stock < 0 or stock != stock.to_integral_value():
+            raise ValueError(f"stock inválido: {fila['stock']}")
+        datos['stock'] = int(stock)
+    return datos
+
+
+@con_reintentos
+def _guardar_bloque(validos, columnas, guardar=True):
+    """Upsert de un bloque {codigo: datos}; devuelve (creados, actualizados, errores)."""
+    with transaction.atomic():
+        consulta = Producto.objects.filter(codigo__in=list(validos))
+        if guardar and 'stock' in columnas:
+            consulta = consulta.select_for_update()  # el stock anterior no debe cambiar hasta el upsert
+        anteriores = {codigo: (id_, stock) for codigo, id_, stock in consulta.values_list('codigo', 'id', 'stock')}
+        existentes = {codigo: id_ for codigo, (id_, _) in anteriores.items()}
+        productos, errores = [], []
+        for codigo, (numero, datos) in validos.items():
+            if codigo not in existentes:
+                faltan = [c for c in OBLIGATORIAS_NUEVOS if c not in datos]
+                if faltan:
+                    errores.append(ErrorFila(numero, codigo, f"producto nuevo sin {', '.join(faltan)}"))
+                    continue
+            productos.append(Producto(**{'stock': 0, 'precio': 0, **datos}))
+
+        if guardar:
+            Producto.objects.bulk_create(
+                productos,
+                update_conflicts=True,
+                unique_fields=['codigo'],
+                update_fields=[c for c in columnas if c != 'codigo'] + ['actualizado'],
+            )
+            # bulk_create no dispara post_save: invalidar el índice del escáner al confirmar
+            ids = list(existentes.values())
+            transaction.on_commit(lambda: indice.invalidar_ids(ids))
+            fragmentos.invalidar(fragmentos.CATALOGO)
+            if 'stock' in columnas:
+                _registrar_movimientos(productos, anteriores)
+
+    actualizados = sum(1 for p in productos if p.codigo in existentes)
+    return len(productos) - actualizados, actualizados, errores
+
+
+def _registrar_movimientos(productos, anteriores):
+    """Diferencias de stock del bloque en el libro (los productos nuevos entran con todo su stock)."""
+    nuevos = [p.codigo for p in productos if p.codigo not in anteriores]
+    ids = dict(Producto.objects.filter(codigo__in=nuevos).values_list('codigo', 'id')) if nuevos else {}
+    cantidades = {}
+    for producto in productos:
+        if producto.codigo in anteriores:
+            producto_id, anterior = anteriores[producto.codigo]
+            cantidades[producto_id] = producto.stock - anterior
+        else:
+            cantidades[ids[producto.codigo]] = producto.stock
+    movimientos.registrar(cantidades, movimientos.IMPORTACION, 'importación de productos')
+
+
+def importar(archivo, nombre, tamano_bloque=TAMANO_BLOQUE, solo_validar=False):
+    """
+    Importa el catálogo y devuelve un Resultado. Con `solo_validar` revisa
+    todo el archivo e informa lo que se crearía o actualizaría sin guardar.
+
+    Cada bloque se guarda en su propia transacción, así que una importación
+    de cientos de miles de filas no retiene el bloqueo de escritura de SQLite
+    y las cajas pueden seguir vendiendo. Si un código se repite dentro de un
+    bloque gana la última fila.
+    """
+    columnas, filas = leer_filas(archivo, nombre)
+    creados = actualizados = errores_totales = 0
+    errores = []
+
+    def anotar(nuevos):
+        nonlocal errores_totales
+        errores_totales += len(nuevos)
+        errores.extend(nuevos[:MAXIMO_ERRORES - len(errores)])
+
+    def procesar(bloque):
+        nonlocal creados, actualizados
+        c, a, e = _guardar_bloque(bloque, columnas, guardar=not solo_validar)
+        creados, actualizados = creados + c, actualizados + a
+        anotar(e)
+
+    bloque = {}
+    for numero, fila in filas:
+        try:
+            datos = validar(fila)
+        except ValueError as error:
+            anotar([ErrorFila(numero, str(fila.get('codigo') or ''), str(error))])
+            continue
+        bloque[datos['codigo']] = (numero, datos)
+        if len(bloque) >= tamano_bloque:
+            procesar(bloque)
+            bloque = {}
+    if bloque:
+        procesar(bloque)
+
+    return Resultado(creados, actualizados, sorted(errores), errores_totales)
@@ -0,0 +1,150 @@
+# usuarios/indice_codigos.py
+"""
+Índice en memoria codigo -> producto para el escáner de la caja.
+
+Cada proceso mantiene su propia copia y las entradas no caducan: las altas,
+ediciones y bajas de Producto las invalidan por señales (ver signals.py) y los
+descuentos de stock por stock.descontar. Los cambios hechos en otros procesos
+se leen de la base cada INDICE_CODIGOS_REVISION segundos como mucho: los
+productos con `actualizado` posterior a la revisión anterior y los de
+ProductoEliminado (dos consultas sobre índices), y solo esas entradas se
+descartan.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .models import Producto, ProductoEliminado
+
+CAMPOS = ('id', 'nombre', 'precio', 'stock', 'codigo')
+
+# Una escritura fija `actualizado` antes de su commit: cada revisión vuelve a
+# mirar este margen para no perder lo que otra transacción confirmó tarde
+MARGEN_REVISION = timedelta(seconds=5)
+
+logger = logging.getLogger(__name__)
+
+
+def serializar(datos):
+    return json.dumps(datos, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class IndiceCodigos:
+    def __init__(self):
+        self._entradas = {}
+        self._codigos_por_id = {}
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.calentado = False
+        self._revisado = None
+        self._proxima_revision = 0
+
+    @property
+    def intervalo_revision(self):
+        return getattr(settings, 'INDICE_CODIGOS_REVISION', 5)
+
+    def _guardar(self, datos):
+        contenido = serializar(datos)
+        self._entradas[datos['codigo']] = contenido
+        self._codigos_por_id[datos['id']] = datos['codigo']
+        return contenido
+
+    def _marcar_revision(self, momento):
+        self._revisado = momento
+        self._proxima_revision = time.monotonic() + self.intervalo_revision
+
+    def calentar(self):
+        """Carga todo el catálogo en una sola consulta."""
+        momento = timezone.now()
+        filas = list(Producto.objects.values(*CAMPOS))
+        with self._candado:
+            self._entradas.clear()
+            self._codigos_por_id.clear()
+            for datos in filas:
+                self._guardar(datos)
+            self.calentado = True
+            self._marcar_revision(momento)
+        return len(filas)
+
+    def revisar(self):
+        """Descarta las entradas de productos cambiados o borrados por otros procesos."""
+        if time.monotonic() < self._proxima_revision:
+            return
+        momento = timezone.now()
+        if self._revisado is not None:
+            desde = self._revisado - MARGEN_REVISION
+            cambiados = list(Producto.objects.filter(actualizado__gte=desde).values_list('id', 'codigo'))
+            cambiados += ProductoEliminado.objects.filter(eliminado__gte=desde).values_list('producto_id', 'codigo')
+            for producto_id, codigo in cambiados:
+                self.invalidar(codigo=codigo, producto_id=producto_id)
+        with self._candado:
+            self._marcar_revision(momento)
+
+    def obtener(self, codigo):
+        """Devuelve el JSON del producto ya serializado, o None si no existe."""
+        self.revisar()
+        contenido = self._entradas.get(codigo)
+        if contenido is not None:
+            self.aciertos += 1
+            return contenido
+
+        self.fallos += 1
+        datos = Producto.objects.filter(codigo=codigo).values(*CAMPOS).first()
+        if datos is None:
+            return None
+        with self._candado:
+            return self._guardar(datos)
+
+    def invalidar(self, codigo=None, producto_id=None):
+        """Elimina la entrada por código y/o por id (cubre cambios de código)."""
+        with self._candado:
+            anterior = self._codigos_por_id.pop(producto_id, None)
+            for clave in (codigo, anterior):
+                if clave is not None:
+                    self._entradas.pop(clave, None)
+
+    def invalidar_ids(self, ids):
+        for producto_id in ids:
+            self.invalidar(producto_id=producto_id)
+
+    def limpiar(self):
+        with self._candado:
+            self._entradas.clear()
+            self._codigos_por_id.clear()
+            self.aciertos = self.fallos = 0
+            self.calentado = False
+            self._revisado = None
+            self._proxima_revision = 0
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._entradas),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0,
+            'calentado': self.calentado,
+        }
+
+
+indice = IndiceCodigos()
+
+
+def calentar_al_iniciar():
+    """Precarga el índice al arrancar el servidor (wsgi/asgi) si está habilitado."""
+    if not getattr(settings, 'INDICE_CODIGOS_CALENTAR', True):
+        return
+    try:
+        total = indice.calentar()
+        logger.info("Índice de códigos precargado con %s productos.", total)
+    except DatabaseError:
+        # Base sin migrar o no disponible: el índice se llenará con cada consulta
+        logger.warning("No se pudo precargar el índice de códigos.", exc_info=True)
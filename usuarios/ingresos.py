@@ -0,0 +1,78 @@
+# usuarios/ingresos.py
+"""
+Informe de ingresos del hotel por rango de fechas.
+
+Factura guarda una copia de las fechas de su reserva (fecha_inicio/fecha_fin,
+con índice), así que el informe no necesita el JOIN con usuarios_reserva. Los
+totales por día, semana o mes salen de una sola consulta agregada y se
+guardan por rango en la caché 'informes' (settings.CACHES, en disco); cada
+escritura de Factura cambia el número de versión con el que se arman las
+claves, de modo que los resultados anteriores dejan de usarse sin tener que
+buscarlos y borrarlos. La versión vive en la misma caché, así que todos los
+trabajadores de gunicorn dejan de servir el informe anterior a la vez.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import Factura
+
+AGRUPACIONES = {
+    'dia': lambda campo: F(campo),
+    'semana': lambda campo: TruncWeek(campo, output_field=DateField()),
+    'mes': lambda campo: TruncMonth(campo, output_field=DateField()),
+}
+
+ALIAS = 'informes'
+CLAVE_VERSION = 'ingresos:version'
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def version():
+    # Si la clave no existe (caché reiniciada) se arranca con la hora para no
+    # reutilizar números de versión de resultados que sigan guardados
+    _cache().add(CLAVE_VERSION, time.time_ns(), None)
+    return _cache().get(CLAVE_VERSION)
+
+
+def invalidar():
+    # Un valor nuevo en lugar de incr(), que en el backend en disco no es atómico
+    _cache().set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def facturas_en_rango(desde, hasta):
+    """Facturas de estadías que empiezan y terminan dentro del rango (como antes con la reserva)."""
+    return Factura.objects.filter(fecha_inicio__gte=desde, fecha_fin__lte=hasta)
+
+
+def calcular(desde, hasta, agrupacion='dia'):
+    filas = list(
+        facturas_en_rango(desde, hasta)
+        .annotate(periodo=AGRUPACIONES[agrupacion]('fecha_inicio'))
+        .values('periodo')
+        .annotate(facturas=Count('id'), total=Sum('total'))
+        .order_by('periodo')
+    )
+    return {
+        'filas': filas,
+        'facturas': sum(f['facturas'] for f in filas),
+        'total': sum((f['total'] for f in filas), 0),
+    }
+
+
+def informe(desde, hasta, agrupacion='dia'):
+    """Totales por periodo del rango, memorizados hasta la próxima escritura de Factura."""
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f"Agrupación inválida: {agrupacion}")
+    clave = f"ingresos:{version()}:{desde}:{hasta}:{agrupacion}"
+    resultado = _cache().get(clave)
+    if resultado is None:
+        resultado = calcular(desde, hasta, agrupacion)
+        _cache().set(clave, resultado, getattr(settings, 'INFORME_INGRESOS_TTL', 3600))
+    return resultado
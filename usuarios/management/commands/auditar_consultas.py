@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.planes import CONSULTAS, auditar
+
+
+class Command(BaseCommand):
+    help = "Revisa el plan de ejecución de las consultas frecuentes y falla si alguna recorre una tabla completa."
+
+    def add_arguments(self, parser):
+        parser.add_argument('consultas', nargs='*', help="Consultas a revisar (por defecto todas).")
+        parser.add_argument('--plan', action='store_true', help="Muestra el plan completo de cada consulta.")
+
+    def handle(self, *args, **options):
+        desconocidas = [n for n in options['consultas'] if n not in CONSULTAS]
+        if desconocidas:
+            raise CommandError(f"Consultas desconocidas: {', '.join(desconocidas)}")
+
+        con_escaneo = []
+        for auditoria in auditar(options['consultas']):
+            if auditoria.escaneos:
+                con_escaneo.append(auditoria.nombre)
+                self.stdout.write(self.style.ERROR(
+                    f"{auditoria.nombre}: recorre completa {', '.join(auditoria.escaneos)}"
+                ))
+            else:
+                self.stdout.write(f"{auditoria.nombre}: ok")
+            if options['plan'] or auditoria.escaneos:
+                for linea in auditoria.plan:
+                    self.stdout.write(f"    {linea}")
+
+        if con_escaneo:
+            raise CommandError(f"{len(con_escaneo)} consultas sin índice: {', '.join(con_escaneo)}")
+        self.stdout.write(self.style.SUCCESS("Todas las consultas frecuentes usan índices."))
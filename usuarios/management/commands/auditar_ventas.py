@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.models import Venta
+from usuarios.precios import auditar_ventas, corregir_ventas
+
+
+class Command(BaseCommand):
+    help = "Recalcula por lotes los totales de las ventas guardadas y reporta las que no cuadran."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument('--hasta', help="Fecha final inclusive (AAAA-MM-DD).")
+        parser.add_argument('--lote', type=int, default=2000)
+        parser.add_argument('--corregir', action='store_true', help="Guarda los totales recalculados.")
+
+    def handle(self, *args, **options):
+        ventas = Venta.objects.all()
+        if options['desde']:
+            ventas = ventas.filter(fecha__date__gte=options['desde'])
+        if options['hasta']:
+            ventas = ventas.filter(fecha__date__lte=options['hasta'])
+
+        diferencias = auditar_ventas(ventas, tamano_lote=options['lote'])
+        for venta, esperado in diferencias:
+            self.stdout.write(
+                f"Venta #{venta.id}: guardado {venta.subtotal}/{venta.iva}/{venta.total}, "
+                f"esperado {esperado.subtotal}/{esperado.iva}/{esperado.total}"
+            )
+
+        if options['corregir'] and diferencias:
+            corregidas = corregir_ventas(diferencias, tamano_lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f"{corregidas} ventas corregidas."))
+        else:
+            self.stdout.write(f"{len(diferencias)} ventas con diferencias.")
@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from usuarios.benchmarks import ESCENARIOS, base_temporal, comparar
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los escenarios de rendimiento sobre una base de datos temporal."
+
+    def add_arguments(self, parser):
+        parser.add_argument('escenarios', nargs='*', help="Escenarios a ejecutar (por defecto todos).")
+        parser.add_argument('--repeticiones', type=int, default=30)
+        parser.add_argument('--listar', action='store_true', help="Muestra los escenarios disponibles.")
+        parser.add_argument(
+            '--param', action='append', default=[], metavar='CLAVE=VALOR',
+            help="Parámetro extra del escenario, p. ej. --param tamanos=10000,100000.",
+        )
+        parser.add_argument('--json', metavar='ARCHIVO', help="Guarda los resultados en un archivo JSON.")
+        parser.add_argument(
+            '--comparar', metavar='ARCHIVO',
+            help="JSON de una ejecución anterior; falla si hay regresiones frente a ella.",
+        )
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.25,
+            help="Aumento del p50 permitido frente a --comparar (0.25 = 25%%).",
+        )
+
+    def handle(self, *args, **options):
+        if options['listar']:
+            for nombre, func in ESCENARIOS.items():
+                self.stdout.write(f"{nombre}: {(func.__doc__ or '').strip()}")
+            return
+
+        nombres = options['escenarios'] or list(ESCENARIOS)
+        desconocidos = [n for n in nombres if n not in ESCENARIOS]
+        if desconocidos:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+        base = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                base = json.load(archivo)['resultados']
+
+        parametros = dict(self.leer_parametro(p) for p in options['param'])
+        resultados = []
+        for nombre in nombres:
+            with base_temporal(archivo=ESCENARIOS[nombre].archivo):
+                filas = ESCENARIOS[nombre](repeticiones=options['repeticiones'], **parametros)
+            for fila in filas:
+                self.stdout.write("  ".join(f"{k}={v}" for k, v in fila.items()))
+            resultados.extend(filas)
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as archivo:
+                json.dump({
+                    'fecha': timezone.now().isoformat(),
+                    'motor': connection.vendor,
+                    'repeticiones': options['repeticiones'],
+                    'parametros': parametros,
+                    'resultados': resultados,
+                }, archivo, indent=2, ensure_ascii=False, default=str)
+            self.stdout.write(f"Resultados guardados en {options['json']}")
+
+        if base is not None:
+            regresiones = comparar(resultados, base, tolerancia=options['tolerancia'])
+            for regresion in regresiones:
+                self.stdout.write(self.style.ERROR(regresion))
+            if regresiones:
+                raise CommandError(f"{len(regresiones)} regresiones frente a {options['comparar']}")
+            self.stdout.write(self.style.SUCCESS("Sin regresiones."))
+
+    def leer_parametro(self, texto):
+        clave, separador, valor = texto.partition('=')
+        if not separador:
+            raise CommandError(f"Parámetro inválido: {texto} (se espera CLAVE=VALOR)")
+        valores = [int(v) if v.isdigit() else v for v in valor.split(',')]
+        return clave, tuple(valores) if ',' in valor else valores[0]
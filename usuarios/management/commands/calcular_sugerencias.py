@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios import reabastecimiento
+
+
+class Command(BaseCommand):
+    help = "Precalcula las sugerencias de compra por proveedor (ejecutar cada noche)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Día de cálculo AAAA-MM-DD (por defecto, hoy).")
+
+    def handle(self, *args, **options):
+        try:
+            hoy = date.fromisoformat(options['fecha']) if options['fecha'] else None
+        except ValueError as error:
+            raise CommandError(f"Fecha inválida: {error}")
+        sugerencias = reabastecimiento.precalcular(hoy)
+        self.stdout.write(self.style.SUCCESS(f"{sugerencias} productos para pedir."))
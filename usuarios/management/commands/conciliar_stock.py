@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios import movimientos
+
+
+class Command(BaseCommand):
+    help = "Compara el stock de cada producto con el libro de movimientos y falla si alguno no coincide."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help="Suma toda la historia de movimientos en lugar de partir de los cortes.",
+        )
+
+    def handle(self, *args, **options):
+        diferencias = 0
+        for diferencia in movimientos.conciliar(completo=options['completo']):
+            diferencias += 1
+            self.stdout.write(self.style.ERROR(
+                f"{diferencia.codigo}: stock {diferencia.stock}, libro {diferencia.libro} "
+                f"({diferencia.stock - diferencia.libro:+})"
+            ))
+        if diferencias:
+            raise CommandError(f"{diferencias} productos con stock distinto al libro de movimientos.")
+        self.stdout.write(self.style.SUCCESS("El stock de todos los productos coincide con el libro."))
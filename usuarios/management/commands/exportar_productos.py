@@ -0,0 +1,21 @@
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from usuarios import exportacion
+
+
+class Command(BaseCommand):
+    help = "Exporta el catálogo de productos a CSV o XLSX (el formato que lee importar_productos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta de salida; la extensión (.csv o .xlsx) define el formato.")
+
+    def handle(self, *args, **options):
+        if options['archivo'].lower().endswith('.xlsx'):
+            with exportacion.xlsx_en_archivo('productos') as origen, open(options['archivo'], 'wb') as destino:
+                shutil.copyfileobj(origen, destino)
+        else:
+            with open(options['archivo'], 'w', encoding='utf-8', newline='') as destino:
+                destino.writelines(exportacion.csv_en_streaming('productos'))
+        self.stdout.write(self.style.SUCCESS(f"Catálogo exportado a {options['archivo']}."))
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from usuarios import facturacion
+
+
+class Command(BaseCommand):
+    help = "Cierre nocturno: crea las facturas de las reservas activas sin factura con salida en el rango."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="AAAA-MM-DD (por defecto, hoy)")
+        parser.add_argument('--hasta', help="AAAA-MM-DD (por defecto, igual a --desde)")
+        parser.add_argument('--lote', type=int, default=facturacion.TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else timezone.localdate()
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else desde
+        except ValueError as error:
+            raise CommandError(f"Fecha inválida: {error}")
+        creadas = facturacion.facturar_reservas(desde, hasta, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{creadas} facturas creadas ({desde} a {hasta})."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.stock import fijar_stock_minimo
+
+
+class Command(BaseCommand):
+    help = "Fija el stock mínimo (umbral de bajo stock) de todos los productos o de una categoría."
+
+    def add_arguments(self, parser):
+        parser.add_argument('minimo', type=int)
+        parser.add_argument('--categoria', help="Solo los productos de esta categoría.")
+
+    def handle(self, *args, **options):
+        actualizados = fijar_stock_minimo(options['minimo'], categoria=options['categoria'])
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} productos con stock mínimo {options['minimo']}."))
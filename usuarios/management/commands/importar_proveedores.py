@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.directorio import TAMANO_BLOQUE, importar
+from usuarios.importacion import ArchivoInvalido
+
+
+class Command(BaseCommand):
+    help = "Importa (crea o actualiza por NIT) proveedores desde un archivo CSV o XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .xlsx.")
+        parser.add_argument('--lote', type=int, default=TAMANO_BLOQUE)
+        parser.add_argument('--validar', action='store_true', help="Solo valida, no guarda nada.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar(
+                    archivo, options['archivo'], tamano_bloque=options['lote'], solo_validar=options['validar'],
+                )
+        except (OSError, ArchivoInvalido) as error:
+            raise CommandError(str(error))
+
+        for error in resultado.errores:
+            self.stdout.write(f"Fila {error.fila} ({error.codigo or 'sin NIT'}): {error.mensaje}")
+        if resultado.errores_totales > len(resultado.errores):
+            self.stdout.write(f"... y {resultado.errores_totales - len(resultado.errores)} errores más.")
+
+        creados, actualizados = ("se crearían", "se actualizarían") if options['validar'] else ("creados", "actualizados")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.creados} {creados}, {resultado.actualizados} {actualizados}, "
+            f"{resultado.errores_totales} filas con errores ({time.perf_counter() - inicio:.1f} s)."
+        ))
@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import socket
+
+from django.db import connections
+from django.core.management.base import BaseCommand
+
+from usuarios.trabajos import trabajar
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de trabajos en segundo plano (reportes PDF)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trabajadores', type=int, default=1, help="Procesos trabajadores a lanzar.")
+        parser.add_argument('--espera', type=float, default=1.0, help="Segundos entre consultas a la cola vacía.")
+        parser.add_argument('--una-vez', action='store_true', help="Termina cuando la cola queda vacía.")
+
+    def handle(self, *args, **options):
+        if options['trabajadores'] <= 1:
+            procesados = self.trabajar(0, options)
+            self.stdout.write(f"{procesados} trabajos procesados.")
+            return
+
+        # Cada proceso abre su propia conexión: no heredar la del padre
+        connections.close_all()
+        procesos = [
+            multiprocessing.Process(target=self.trabajar, args=(n, options), daemon=False)
+            for n in range(options['trabajadores'])
+        ]
+        for proceso in procesos:
+            proceso.start()
+        try:
+            for proceso in procesos:
+                proceso.join()
+        except KeyboardInterrupt:
+            for proceso in procesos:
+                proceso.join()
+
+    def trabajar(self, numero, options):
+        trabajador = f"{socket.gethostname()}:{os.getpid()}:{numero}"
+        try:
+            return trabajar(trabajador, una_vez=options['una_vez'], espera=options['espera'])
+        except KeyboardInterrupt:
+            return 0
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from usuarios import disponibilidad
+
+
+class Command(BaseCommand):
+    help = "Regenera el calendario de noches ocupadas (OcupacionNoche) a partir de las reservas activas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        noches = disponibilidad.reconstruir(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Calendario reconstruido ({noches} noches ocupadas)."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from usuarios import resumenes
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes diarios y mensuales de ventas a partir de Venta y DetalleVenta."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Primer día a recalcular (AAAA-MM-DD); se amplía al mes completo.")
+        parser.add_argument('--hasta', help="Último día a recalcular (AAAA-MM-DD); se amplía al mes completo.")
+        parser.add_argument('--lote', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for clave in ('desde', 'hasta'):
+            valor = options[clave]
+            fechas[clave] = parse_date(valor) if valor else None
+            if valor and fechas[clave] is None:
+                raise CommandError(f"Fecha inválida: {valor}")
+
+        filas = resumenes.reconstruir(fechas['desde'], fechas['hasta'], tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes reconstruidos ({filas} filas por producto)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios import movimientos
+
+
+class Command(BaseCommand):
+    help = "Guarda el corte de stock según el libro de los productos que se movieron desde el último corte."
+
+    def handle(self, *args, **options):
+        try:
+            cortes = movimientos.tomar_corte()
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"{cortes} productos en el corte."))
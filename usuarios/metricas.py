@@ -0,0 +1,192 @@
+# usuarios/metricas.py
+"""
+Consultas SQL y tiempos por petición (base de datos, plantillas y PDF).
+
+`medicion()` abre un bloque que cuenta las consultas de todas las conexiones
+(con execute_wrapper) y acumula el tiempo de los componentes que se miden con
+`medir(nombre)`; las plantillas se miden desde el backend PlantillasDjango
+(settings.TEMPLATES) y los PDF desde facturas_pdf y trabajos.
+MetricasMiddleware usa una medición por petición, la devuelve en la cabecera
+Server-Timing y la suma a los histogramas por ruta que expone /metrics en
+formato Prometheus. Los histogramas son de este proceso: con varios
+trabajadores de gunicorn cada uno publica los suyos.
+"""
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+PREFIJO = 'orquidea'
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+COMPONENTES = ('db', 'plantilla', 'pdf')
+
+_actual = ContextVar('medicion', default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.consultas = 0
+        self.tiempos = dict.fromkeys(COMPONENTES, 0.0)
+        self.total = 0.0
+
+    def sumar(self, componente, segundos):
+        self.tiempos[componente] = self.tiempos.get(componente, 0.0) + segundos
+
+    def envolver_consulta(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.sumar('db', time.perf_counter() - inicio)
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (duraciones en milisegundos)."""
+        partes = [f'db;dur={self.tiempos["db"] * 1000:.1f};desc="{self.consultas} consultas"']
+        partes += [
+            f'{componente};dur={segundos * 1000:.1f}'
+            for componente, segundos in self.tiempos.items() if componente != 'db'
+        ]
+        partes.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(partes)
+
+
+@contextmanager
+def medicion():
+    """Mide las consultas y los componentes ejecutados dentro del bloque."""
+    actual = Medicion()
+    token = _actual.set(actual)
+    inicio = time.perf_counter()
+    try:
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(actual.envolver_consulta))
+            yield actual
+    finally:
+        actual.total = time.perf_counter() - inicio
+        _actual.reset(token)
+
+
+@contextmanager
+def medir(componente):
+    """Suma la duración del bloque al componente de la medición en curso (si la hay)."""
+    actual = _actual.get()
+    if actual is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        actual.sumar(componente, time.perf_counter() - inicio)
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+class Histograma:
+    def __init__(self, cubetas):
+        self.cubetas = cubetas
+        self.conteos = [0] * (len(cubetas) + 1)
+        self.suma = 0.0
+
+    def observar(self, valor):
+        self.conteos[bisect.bisect_left(self.cubetas, valor)] += 1
+        self.suma += valor
+
+    def lineas(self, nombre, etiquetas):
+        acumulado = 0
+        for limite, conteo in zip(self.cubetas + ('+Inf',), self.conteos):
+            acumulado += conteo
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        yield f'{nombre}_sum{{{etiquetas}}} {self.suma:.6f}'
+        yield f'{nombre}_count{{{etiquetas}}} {acumulado}'
+
+
+class RegistroMetricas:
+    METRICAS = {
+        'peticion_segundos': ("Duración de la petición por ruta.", CUBETAS_SEGUNDOS),
+        'peticion_consultas': ("Consultas SQL por petición.", CUBETAS_CONSULTAS),
+        'componente_segundos': ("Tiempo por componente (db, plantilla, pdf) dentro de la petición.", CUBETAS_SEGUNDOS),
+    }
+
+    def __init__(self):
+        self._histogramas = {nombre: {} for nombre in self.METRICAS}
+        self._candado = threading.Lock()
+
+    def _observar(self, metrica, etiquetas, valor):
+        histogramas = self._histogramas[metrica]
+        if etiquetas not in histogramas:
+            histogramas[etiquetas] = Histograma(self.METRICAS[metrica][1])
+        histogramas[etiquetas].observar(valor)
+
+    def registrar(self, ruta, metodo, medicion):
+        with self._candado:
+            self._observar('peticion_segundos', (('ruta', ruta), ('metodo', metodo)), medicion.total)
+            self._observar('peticion_consultas', (('ruta', ruta),), medicion.consultas)
+            for componente, segundos in medicion.tiempos.items():
+                if not segundos and componente != 'db':
+                    continue  # la ruta no usa ese componente (p. ej. no genera PDF)
+                self._observar('componente_segundos', (('ruta', ruta), ('componente', componente)), segundos)
+
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus."""
+        lineas = []
+        with self._candado:
+            for metrica, (ayuda, _) in self.METRICAS.items():
+                nombre = f'{PREFIJO}_{metrica}'
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+                for etiquetas, histograma in sorted(self._histogramas[metrica].items()):
+                    texto = ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in etiquetas)
+                    lineas.extend(histograma.lineas(nombre, texto))
+        return '\n'.join(lineas) + '\n'
+
+    def limpiar(self):
+        with self._candado:
+            for histogramas in self._histogramas.values():
+                histogramas.clear()
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registro = RegistroMetricas()
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+class MetricasMiddleware:
+    """Mide cada petición, añade Server-Timing y la registra en los histogramas de su ruta."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medicion() as actual:
+            response = self.get_response(request)
+        response['Server-Timing'] = actual.server_timing()
+
+        coincidencia = request.resolver_match
+        ruta = coincidencia.route if coincidencia else 'sin_ruta'
+        if ruta != 'metrics':
+            registro.registrar(ruta, request.method, actual)
+        return response
+
+
+class Plantilla(Template):
+    def render(self, context=None, request=None):
+        with medir('plantilla'):
+            return super().render(context, request)
+
+
+class PlantillasDjango(DjangoTemplates):
+    """Backend de plantillas de Django que mide el tiempo de render."""
+
+    def from_string(self, template_code):
+        return Plantilla(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Plantilla(super().get_template(template_name).template, self)
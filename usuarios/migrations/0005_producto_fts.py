@@ -0,0 +1,24 @@
+# Índice de búsqueda de texto completo (FTS5) para Producto; solo en SQLite
+
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    from usuarios import busqueda
+    busqueda.instalar(schema_editor.connection, reconstruir=True)
+
+
+def eliminar_indice(apps, schema_editor):
+    from usuarios import busqueda
+    busqueda.eliminar(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_producto_actualizado'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
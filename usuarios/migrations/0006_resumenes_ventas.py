@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate, TruncMonth
+
+
+def reconstruir_resumenes(apps, schema_editor):
+    # Igual que resumenes.reconstruir, para las ventas anteriores a los resúmenes
+    Venta = apps.get_model('usuarios', 'Venta')
+    DetalleVenta = apps.get_model('usuarios', 'DetalleVenta')
+    ResumenVenta = apps.get_model('usuarios', 'ResumenVenta')
+    ResumenVentaProducto = apps.get_model('usuarios', 'ResumenVentaProducto')
+
+    for periodo, truncar in (('D', TruncDate), ('M', TruncMonth)):
+        por_venta = (
+            Venta.objects.annotate(dia=truncar('fecha', output_field=models.DateField()))
+            .values('dia')
+            .annotate(n=models.Count('id'), s=models.Sum('subtotal'), i=models.Sum('iva'), t=models.Sum('total'))
+            .order_by()
+        )
+        ResumenVenta.objects.bulk_create(
+            (ResumenVenta(periodo=periodo, fecha=f['dia'], ventas=f['n'],
+                          subtotal=f['s'], iva=f['i'], total=f['t'])
+             for f in por_venta.iterator()),
+            batch_size=1000,
+        )
+
+        por_producto = (
+            DetalleVenta.objects.annotate(dia=truncar('venta__fecha', output_field=models.DateField()))
+            .values('dia', 'producto_id')
+            .annotate(c=models.Sum('cantidad'), s=models.Sum('subtotal'))
+            .order_by()
+        )
+        ResumenVentaProducto.objects.bulk_create(
+            (ResumenVentaProducto(periodo=periodo, fecha=f['dia'], producto_id=f['producto_id'],
+                                  cantidad=f['c'], importe=f['s'])
+             for f in por_producto.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_producto_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('D', 'Diario'), ('M', 'Mensual')], max_length=1)),
+                ('fecha', models.DateField()),
+                ('ventas', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'fecha'), name='resumen_venta_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenVentaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('D', 'Diario'), ('M', 'Mensual')], max_length=1)),
+                ('fecha', models.DateField()),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'fecha', 'producto'), name='resumen_producto_unico')],
+            },
+        ),
+        migrations.RunPython(reconstruir_resumenes, migrations.RunPython.noop),
+    ]
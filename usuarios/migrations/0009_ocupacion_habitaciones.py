@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def llenar_calendario(apps, schema_editor):
+    # Noches ocupadas de las reservas que ya existían (después lo mantienen las señales)
+    Reserva = apps.get_model('usuarios', 'Reserva')
+    OcupacionNoche = apps.get_model('usuarios', 'OcupacionNoche')
+    lote = []
+    reservas = Reserva.objects.filter(estado_reserva='reservada', habitacion__isnull=False)
+    for reserva in reservas.iterator():
+        for n in range((reserva.fecha_fin - reserva.fecha_inicio).days):
+            lote.append(OcupacionNoche(
+                habitacion_id=reserva.habitacion_id, reserva_id=reserva.id,
+                fecha=reserva.fecha_inicio + timedelta(days=n),
+            ))
+    OcupacionNoche.objects.bulk_create(lote, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0008_trabajos_reporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionNoche',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['habitacion', 'fecha_inicio', 'fecha_fin'], name='reserva_habitacion_fechas_idx'),
+        ),
+        migrations.AddField(
+            model_name='ocupacionnoche',
+            name='habitacion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.habitacion'),
+        ),
+        migrations.AddField(
+            model_name='ocupacionnoche',
+            name='reserva',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='noches', to='usuarios.reserva'),
+        ),
+        migrations.AddIndex(
+            model_name='ocupacionnoche',
+            index=models.Index(fields=['fecha', 'habitacion'], name='ocupacion_fecha_idx'),
+        ),
+        migrations.RunPython(llenar_calendario, migrations.RunPython.noop),
+    ]
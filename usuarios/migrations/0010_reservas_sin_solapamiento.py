@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+SQL_EXCLUSION = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    """ALTER TABLE usuarios_reserva ADD CONSTRAINT reserva_sin_solapamiento
+       EXCLUDE USING gist (habitacion_id WITH =, daterange(fecha_inicio, fecha_fin, '[)') WITH &&)
+       WHERE (estado_reserva = 'reservada' AND habitacion_id IS NOT NULL)""",
+]
+
+
+def quitar_noches_repetidas(apps, schema_editor):
+    # Reservas solapadas anteriores a esta migración: la noche queda para la reserva más antigua
+    OcupacionNoche = apps.get_model('usuarios', 'OcupacionNoche')
+    primeras = (
+        OcupacionNoche.objects.values('habitacion_id', 'fecha')
+        .annotate(primera=models.Min('id')).values('primera')
+    )
+    OcupacionNoche.objects.exclude(id__in=primeras).delete()
+
+
+def reservas_solapadas(Reserva):
+    """Pares (reserva, otra posterior) activos en la misma habitación con noches en común."""
+    activas = Reserva.objects.filter(estado_reserva='reservada', habitacion__isnull=False)
+    posterior = activas.filter(
+        habitacion_id=models.OuterRef('habitacion_id'), id__gt=models.OuterRef('id'),
+        fecha_inicio__lt=models.OuterRef('fecha_fin'), fecha_fin__gt=models.OuterRef('fecha_inicio'),
+    ).order_by('id')
+    return (
+        activas.annotate(otra=models.Subquery(posterior.values('id')[:1]))
+        .filter(otra__isnull=False)
+        .order_by('id')
+        .values_list('id', 'otra')
+    )
+
+
+def crear_exclusion(apps, schema_editor):
+    # En PostgreSQL la propia tabla de reservas rechaza rangos que se crucen
+    if schema_editor.connection.vendor == 'postgresql':
+        pares = list(reservas_solapadas(apps.get_model('usuarios', 'Reserva'))[:20])
+        if pares:
+            # Sin esto ALTER TABLE falla con un error de la restricción sin decir qué reservas son
+            raise RuntimeError(
+                "Hay reservas activas que se cruzan en la misma habitación; cancele o mueva una de "
+                "cada par antes de migrar: " + ", ".join(f"{a} y {b}" for a, b in pares)
+            )
+        for sentencia in SQL_EXCLUSION:
+            schema_editor.execute(sentencia)
+
+
+def eliminar_exclusion(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE usuarios_reserva DROP CONSTRAINT IF EXISTS reserva_sin_solapamiento")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0009_ocupacion_habitaciones'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_noches_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ocupacionnoche',
+            constraint=models.UniqueConstraint(fields=('habitacion', 'fecha'), name='ocupacion_noche_unica'),
+        ),
+        migrations.RunPython(crear_exclusion, eliminar_exclusion),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copiar_fechas(apps, schema_editor):
+    Factura = apps.get_model('usuarios', 'Factura')
+    Reserva = apps.get_model('usuarios', 'Reserva')
+    reserva = Reserva.objects.filter(id=models.OuterRef('reserva_id'))
+    Factura.objects.update(
+        fecha_inicio=models.Subquery(reserva.values('fecha_inicio')[:1]),
+        fecha_fin=models.Subquery(reserva.values('fecha_fin')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0010_reservas_sin_solapamiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='fecha_fin',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='fecha_inicio',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha_inicio', 'fecha_fin'], name='factura_estadia_idx'),
+        ),
+        migrations.RunPython(copiar_fechas, migrations.RunPython.noop),
+    ]
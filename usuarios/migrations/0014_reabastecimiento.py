@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0013_stock_minimo_producto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('dias_entrega', models.PositiveIntegerField(default=7)),
+                ('lote_minimo', models.PositiveIntegerField(default=1)),
+                ('principal', models.BooleanField(default=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proveedores', to='usuarios.producto')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='productos', to='usuarios.proveedor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('producto', 'proveedor'), name='producto_proveedor_unico'), models.UniqueConstraint(condition=models.Q(('principal', True)), fields=('producto',), name='proveedor_principal_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SugerenciaCompra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('venta_diaria', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock', models.PositiveIntegerField()),
+                ('punto_pedido', models.PositiveIntegerField()),
+                ('cantidad', models.PositiveIntegerField()),
+                ('costo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.producto')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.proveedor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['proveedor', 'producto'], name='sugerencia_proveedor_idx')],
+            },
+        ),
+    ]
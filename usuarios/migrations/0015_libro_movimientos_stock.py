@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def stock_inicial(apps, schema_editor):
+    # El libro empieza con el stock actual de cada producto
+    Producto = apps.get_model('usuarios', 'Producto')
+    MovimientoStock = apps.get_model('usuarios', 'MovimientoStock')
+    ahora = timezone.now()
+    MovimientoStock.objects.bulk_create((
+        MovimientoStock(producto_id=producto_id, tipo='inicial', cantidad=stock, fecha=ahora)
+        for producto_id, stock in Producto.objects.filter(stock__gt=0).values_list('id', 'stock').iterator()
+    ), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0014_reabastecimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('momento', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes', to='usuarios.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('producto', 'momento'), name='corte_producto_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('inicial', 'Stock inicial'), ('venta', 'Venta'), ('compra', 'Compra de cliente'), ('ajuste', 'Ajuste manual'), ('importacion', 'Importación')], max_length=15)),
+                ('cantidad', models.IntegerField()),
+                ('fecha', models.DateTimeField()),
+                ('referencia', models.CharField(blank=True, max_length=50)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='usuarios.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'), models.Index(fields=['fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(stock_inicial, migrations.RunPython.noop),
+    ]
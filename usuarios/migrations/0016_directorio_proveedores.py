@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def calcular_claves(apps, schema_editor):
+    # Igual que directorio.clave en el momento de esta migración
+    Proveedor = apps.get_model('usuarios', 'Proveedor')
+    proveedores = list(Proveedor.objects.only('id', 'nombre').iterator())
+    for proveedor in proveedores:
+        texto = unicodedata.normalize('NFKD', proveedor.nombre or '').encode('ascii', 'ignore').decode()
+        proveedor.nombre_clave = re.sub(r'\s+', ' ', texto.strip().lower())
+    Proveedor.objects.bulk_update(proveedores, ['nombre_clave'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0015_libro_movimientos_stock'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='proveedor',
+            name='proveedor_nombre_idx',
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='nombre_clave',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='proveedor',
+            index=models.Index(fields=['nombre_clave', 'id'], name='proveedor_nombre_idx'),
+        ),
+        migrations.RunPython(calcular_claves, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def activar_wal(apps, schema_editor):
+    # journal_mode=WAL se guarda en el archivo de la base: basta con fijarlo una
+    # vez (settings solo pone los PRAGMA de cada conexión). No se puede cambiar
+    # dentro de una transacción, por eso la migración no es atómica.
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+
+def desactivar_wal(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=DELETE')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('usuarios', '0016_directorio_proveedores'),
+    ]
+
+    operations = [
+        migrations.RunPython(activar_wal, desactivar_wal),
+    ]
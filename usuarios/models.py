@@ -36,10 +36,42 @@ class Producto(models.Model):
     stock = models.PositiveIntegerField()
     categoria = models.CharField(max_length=100)
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Por debajo de este stock el producto está "bajo" (stock.con_estado); se
+    # puede fijar por categoría con manage.py fijar_stock_minimo
+    stock_minimo = models.PositiveIntegerField(default=10)
+    # Marca de cambio para la sincronización incremental del catálogo en las cajas
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['actualizado', 'id'], name='producto_actualizado_idx'),
+            # Filtro y DISTINCT de categorías en inventario y compras (ordenado por nombre)
+            models.Index(fields=['categoria', 'nombre'], name='producto_categoria_idx'),
+            # Stock bajo en reportes
+            models.Index(fields=['stock'], name='producto_stock_idx'),
+            # Inventario paginado por nombre; el filtro "bajo stock" compara dos
+            # columnas, así que tiene un índice parcial con solo esas filas
+            # ("sin stock" usa producto_stock_idx)
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+            models.Index(
+                fields=['nombre', 'id'], condition=models.Q(stock__gt=0, stock__lt=models.F('stock_minimo')),
+                name='producto_stock_bajo_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.nombre} ({self.codigo})"
 
+
+# Registro de productos eliminados para que las cajas los quiten en la sincronización
+class ProductoEliminado(models.Model):
+    producto_id = models.BigIntegerField()
+    codigo = models.CharField(max_length=20)
+    eliminado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Producto {self.codigo} eliminado"
+
 class Venta(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True)
@@ -50,6 +82,12 @@ class Venta(models.Model):
     caja = models.CharField(max_length=100, null=True, blank=True)
     vendedor = models.CharField(max_length=100, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Orden del historial de reportes (paginación por fecha, id)
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Venta #{self.id} - {self.fecha.strftime('%Y-%m-%d')}"
 
@@ -64,6 +102,46 @@ class DetalleVenta(models.Model):
         return f"{self.cantidad} x {self.producto.nombre}"
 
 
+# Resúmenes de ventas precalculados para los reportes (se actualizan al guardar cada venta)
+PERIODO_RESUMEN_CHOICES = [
+    ('D', 'Diario'),
+    ('M', 'Mensual'),
+]
+
+
+class ResumenVenta(models.Model):
+    periodo = models.CharField(max_length=1, choices=PERIODO_RESUMEN_CHOICES)
+    fecha = models.DateField()  # día, o primer día del mes en los resúmenes mensuales
+    ventas = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    iva = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'fecha'], name='resumen_venta_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_periodo_display()} {self.fecha}: {self.ventas} ventas"
+
+
+class ResumenVentaProducto(models.Model):
+    periodo = models.CharField(max_length=1, choices=PERIODO_RESUMEN_CHOICES)
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField(default=0)
+    importe = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'fecha', 'producto'], name='resumen_producto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_periodo_display()} {self.fecha}: {self.cantidad} x {self.producto_id}"
+
+
 # Modelo para registrar las compras
 class Compra(models.Model):
     cliente = models.ForeignKey('Cliente', on_delete=models.CASCADE)
@@ -72,6 +150,12 @@ class Compra(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     fecha_compra = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Historial de compras del cliente, más recientes primero
+            models.Index(fields=['cliente', '-fecha_compra'], name='compra_cliente_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"Compra de {self.producto.nombre} por {self.cliente.nombre_cliente} ({self.cantidad})"
 
@@ -120,9 +204,36 @@ class Reserva(models.Model):
     habitacion = models.ForeignKey('Habitacion', on_delete=models.SET_NULL, null=True, blank=True)  # Ahora es obligatorio
     empleado = models.ForeignKey('Empleado', on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Búsqueda de reservas que se cruzan con un rango en una habitación
+            models.Index(fields=['habitacion', 'fecha_inicio', 'fecha_fin'], name='reserva_habitacion_fechas_idx'),
+            # Cierre nocturno: reservas por fecha de salida y estado (facturacion.py)
+            models.Index(fields=['fecha_fin', 'estado_reserva'], name='reserva_salida_estado_idx'),
+        ]
+
     def __str__(self):
         return f"Reserva {self.id} - {self.estado_reserva}"
 
+
+# Calendario de ocupación: una fila por noche ocupada (ver disponibilidad.py)
+class OcupacionNoche(models.Model):
+    habitacion = models.ForeignKey(Habitacion, on_delete=models.CASCADE)
+    fecha = models.DateField()  # noche del fecha al fecha + 1
+    reserva = models.ForeignKey(Reserva, on_delete=models.CASCADE, related_name='noches')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'habitacion'], name='ocupacion_fecha_idx'),
+        ]
+        constraints = [
+            # Una habitación no puede estar ocupada dos veces la misma noche (ver reservas.py)
+            models.UniqueConstraint(fields=['habitacion', 'fecha'], name='ocupacion_noche_unica'),
+        ]
+
+    def __str__(self):
+        return f"Habitación {self.habitacion_id} ocupada la noche del {self.fecha}"
+
 #//////////////////////////////////////////////////////////////////////////////////////////////////////////
 # Modelo Reporte
 class Reporte(models.Model):
@@ -132,6 +243,38 @@ class Reporte(models.Model):
 
     def __str__(self):
         return f"Reporte {self.id} - {self.tipo_reporte}"
+#//////////////////////////////////////////////////////////////////////////////////////////////////////////
+# Trabajos en segundo plano (cola en la base de datos, ver trabajos.py)
+ESTADO_TRABAJO_CHOICES = [
+    ('pendiente', 'Pendiente'),
+    ('en_proceso', 'En proceso'),
+    ('terminado', 'Terminado'),
+    ('fallido', 'Fallido'),
+]
+
+
+class TrabajoReporte(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_TRABAJO_CHOICES, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)  # porcentaje
+    mensaje = models.CharField(max_length=255, blank=True)
+    archivo = models.CharField(max_length=255, blank=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Los trabajadores toman el pendiente más antiguo
+            models.Index(fields=['estado', 'id'], name='trabajo_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id} - {self.tipo} ({self.estado})"
+
 #//////////////////////////////////////////////////////////////////////////////////////////////////////////    
 #Modelo factura
 class Factura(models.Model):
@@ -142,9 +285,15 @@ class Factura(models.Model):
     precio_por_noche = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     pagada = models.BooleanField(default=False)
+    # Copia de las fechas de la reserva para el informe de ingresos (ver ingresos.py)
+    fecha_inicio = models.DateField(null=True, blank=True)
+    fecha_fin = models.DateField(null=True, blank=True)
 
     class Meta:
         db_table = 'usuarios_factura'  # <== esto hace que la tabla se llame así en SQLite
+        indexes = [
+            models.Index(fields=['fecha_inicio', 'fecha_fin'], name='factura_estadia_idx'),
+        ]
 
     def __str__(self):
         return f"Factura de {self.usuario.username} - Reserva {self.reserva.id}"
@@ -157,7 +306,101 @@ class Proveedor(models.Model):
     correo = models.EmailField(max_length=100, blank=True, null=True)
     direccion = models.CharField(max_length=255, blank=True, null=True)
     nit = models.CharField(max_length=20, unique=True)
+    # Nombre en minúsculas y sin tildes (directorio.clave): orden del directorio
+    # y búsqueda por prefijo sobre el índice; se llena en signals.py
+    nombre_clave = models.CharField(max_length=100, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre_clave', 'id'], name='proveedor_nombre_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} - {self.nit}"
 
+
+# Proveedores de cada producto; el principal es al que se le sugiere el pedido
+class ProductoProveedor(models.Model):
+    producto = models.ForeignKey(Producto, related_name='proveedores', on_delete=models.CASCADE)
+    proveedor = models.ForeignKey(Proveedor, related_name='productos', on_delete=models.CASCADE)
+    costo = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    dias_entrega = models.PositiveIntegerField(default=7)
+    lote_minimo = models.PositiveIntegerField(default=1)  # se pide en múltiplos de este lote
+    principal = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'proveedor'], name='producto_proveedor_unico'),
+            models.UniqueConstraint(
+                fields=['producto'], condition=models.Q(principal=True), name='proveedor_principal_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.codigo} <- {self.proveedor.nombre}"
+
+
+# Pedido sugerido por producto, precalculado cada noche (reabastecimiento.py)
+class SugerenciaCompra(models.Model):
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    fecha = models.DateField()  # día con el que se calcularon las ventanas
+    venta_diaria = models.DecimalField(max_digits=10, decimal_places=2)  # media ponderada de las ventanas
+    stock = models.PositiveIntegerField()
+    punto_pedido = models.PositiveIntegerField()
+    cantidad = models.PositiveIntegerField()
+    costo = models.DecimalField(max_digits=10, decimal_places=2)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['proveedor', 'producto'], name='sugerencia_proveedor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.proveedor.nombre}: {self.cantidad} x {self.producto.codigo}"
+
+
+
+#//////////////////////////////////////////////////////////////////////////////////////////////////////////
+# Libro de movimientos de stock (movimientos.py): solo se agregan filas, nunca se editan
+TIPO_MOVIMIENTO_CHOICES = [
+    ('inicial', 'Stock inicial'),
+    ('venta', 'Venta'),
+    ('compra', 'Compra de cliente'),
+    ('ajuste', 'Ajuste manual'),
+    ('importacion', 'Importación'),
+]
+
+
+class MovimientoStock(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=15, choices=TIPO_MOVIMIENTO_CHOICES)
+    cantidad = models.IntegerField()  # positiva entra, negativa sale
+    fecha = models.DateTimeField()
+    referencia = models.CharField(max_length=50, blank=True)  # p. ej. "venta 15"
+
+    class Meta:
+        indexes = [
+            # Suma de los movimientos de un producto posteriores a su último corte
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['fecha'], name='movimiento_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+} x {self.producto_id}"
+
+
+# Stock de un producto según el libro en un momento (corte periódico)
+class CorteStock(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='cortes')
+    momento = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'momento'], name='corte_producto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.momento}: {self.stock}"
@@ -0,0 +1,124 @@
+# usuarios/movimientos.py
+"""
+Libro de movimientos de stock y cortes periódicos.
+
+Cada cambio de Producto.stock deja una fila en MovimientoStock dentro de la
+misma transacción: las ventas y compras de clientes desde stock.descontar, las
+ediciones manuales desde guardar_con_ajuste, las importaciones desde
+importacion.py y el stock con que se crea un producto desde signals.py. Las
+filas solo se agregan (bulk_create) y nunca se editan.
+
+El comando nocturno `tomar_corte_stock` guarda en CorteStock el stock según el
+libro de los productos que se movieron desde el corte anterior. Así el stock
+en una fecha es el último corte anterior más los pocos movimientos que lo
+siguen, sin sumar toda la historia; `conciliar_stock` compara cada
+Producto.stock con ese valor en una sola consulta que se recorre por bloques.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import DateTimeField, F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CorteStock, MovimientoStock, Producto
+
+INICIAL, VENTA, COMPRA, AJUSTE, IMPORTACION = 'inicial', 'venta', 'compra', 'ajuste', 'importacion'
+TAMANO_LOTE = 2000
+
+# Momento anterior a cualquier movimiento, para los productos sin corte
+SIN_CORTE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+Diferencia = namedtuple('Diferencia', ['producto_id', 'codigo', 'stock', 'libro'])
+
+
+def registrar(cantidades, tipo, referencia=''):
+    """
+    Agrega al libro {producto_id: cantidad} (negativa si sale) con un solo
+    bulk_create. Debe llamarse en la transacción que cambia el stock.
+    """
+    fecha = timezone.now()
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=producto_id, tipo=tipo, cantidad=cantidad, fecha=fecha, referencia=referencia)
+        for producto_id, cantidad in cantidades.items() if cantidad
+    ], batch_size=TAMANO_LOTE)
+
+
+def guardar_con_ajuste(producto, tipo=AJUSTE, referencia=''):
+    """Guarda un producto existente y registra la diferencia con el stock que tenía en la base."""
+    with transaction.atomic():
+        anterior = Producto.objects.select_for_update().values_list('stock', flat=True).get(pk=producto.pk)
+        producto.save()
+        registrar({producto.pk: int(producto.stock) - anterior}, tipo, referencia)
+
+
+def _suma_movimientos(movimientos):
+    return Coalesce(
+        Subquery(movimientos.order_by().values('producto').annotate(total=Sum('cantidad')).values('total')),
+        0,
+    )
+
+
+def con_stock_libro(productos, momento=None, cortes=True):
+    """
+    Anota `stock_libro`: el stock según el libro en `momento` (ahora si no se
+    indica). Con `cortes` parte del último corte de cada producto y solo suma
+    los movimientos posteriores (índice producto + fecha); sin cortes suma
+    toda la historia.
+    """
+    movimientos = MovimientoStock.objects.filter(producto=OuterRef('pk'))
+    if momento is not None:
+        movimientos = movimientos.filter(fecha__lte=momento)
+    if not cortes:
+        return productos.annotate(stock_libro=_suma_movimientos(movimientos))
+
+    ultimo = CorteStock.objects.filter(producto=OuterRef('pk')).order_by('-momento')
+    if momento is not None:
+        ultimo = ultimo.filter(momento__lte=momento)
+    return productos.annotate(
+        corte_momento=Coalesce(
+            Subquery(ultimo.values('momento')[:1]), Value(SIN_CORTE, output_field=DateTimeField()),
+        ),
+        corte_stock=Coalesce(Subquery(ultimo.values('stock')[:1]), 0, output_field=IntegerField()),
+    ).annotate(
+        stock_libro=F('corte_stock') + _suma_movimientos(movimientos.filter(fecha__gt=OuterRef('corte_momento'))),
+    )
+
+
+def stock_en(producto_id, momento):
+    """Stock de un producto en `momento` según el libro (un corte y los movimientos que lo siguen)."""
+    return con_stock_libro(Producto.objects.filter(pk=producto_id), momento).values_list(
+        'stock_libro', flat=True,
+    ).get()
+
+
+def tomar_corte(momento=None):
+    """Guarda el corte de los productos con movimientos desde el corte anterior; devuelve cuántos."""
+    momento = momento or timezone.now()
+    ultimo = CorteStock.objects.aggregate(ultimo=Max('momento'))['ultimo']
+    if ultimo is not None and momento <= ultimo:
+        raise ValueError(f"Ya hay un corte en {ultimo:%Y-%m-%d %H:%M}, posterior o igual a {momento:%Y-%m-%d %H:%M}.")
+
+    movidos = MovimientoStock.objects.filter(fecha__gt=ultimo or SIN_CORTE, fecha__lte=momento)
+    filas = con_stock_libro(
+        Producto.objects.filter(id__in=movidos.values('producto_id')), momento,
+    ).values_list('id', 'stock_libro')
+    with transaction.atomic():
+        creados = CorteStock.objects.bulk_create([
+            CorteStock(producto_id=producto_id, momento=momento, stock=stock)
+            for producto_id, stock in filas.iterator(chunk_size=TAMANO_LOTE)
+        ], batch_size=TAMANO_LOTE)
+    return len(creados)
+
+
+def conciliar(completo=False):
+    """Productos cuyo stock no coincide con el libro; una sola consulta leída por bloques."""
+    diferencias = (
+        con_stock_libro(Producto.objects.all(), cortes=not completo)
+        .exclude(stock=F('stock_libro'))
+        .order_by('id')
+        .values_list('id', 'codigo', 'stock', 'stock_libro')
+    )
+    for fila in diferencias.iterator(chunk_size=TAMANO_LOTE):
+        yield Diferencia(*fila)
@@ -0,0 +1,87 @@
+# usuarios/paginacion.py
+"""
+Paginación por clave (keyset) para tablas grandes.
+
+En lugar de OFFSET, cada página pide las filas posteriores a la última que se
+mostró según el orden de la consulta, así que la página 1.000 cuesta lo mismo
+que la primera si hay un índice sobre las columnas de orden.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _valor(fila, campo):
+    if isinstance(fila, dict):
+        return fila[campo]
+    for parte in campo.split('__'):
+        fila = getattr(fila, parte)
+    return fila
+
+
+class _Codificador(DjangoJSONEncoder):
+    # DjangoJSONEncoder recorta los microsegundos y el cursor dejaría de coincidir
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar(valores):
+    texto = json.dumps(valores, cls=_Codificador)
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar(cursor, cantidad):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise CursorInvalido("Cursor inválido.")
+    if not isinstance(valores, list) or len(valores) != cantidad:
+        raise CursorInvalido("Cursor inválido.")
+    return valores
+
+
+def despues_de(orden, valores):
+    """Q con las filas que van después de `valores` en el orden dado (p. ej. ['-fecha', '-id'])."""
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f"{nombre}__{operador}": valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def paginar(queryset, orden, cursor=None, limite=50):
+    """
+    Devuelve (filas, siguiente_cursor) para una página de `queryset`.
+
+    `orden` debe terminar en una columna única (normalmente el id) para que el
+    cursor sea inequívoco. Las filas pueden ser instancias o diccionarios de
+    values(); en ese caso deben incluir las columnas de orden.
+    """
+    queryset = queryset.order_by(*orden)
+    if cursor:
+        queryset = queryset.filter(despues_de(orden, decodificar(cursor, len(orden))))
+
+    try:
+        filas = list(queryset[:limite + 1])
+    except (ValidationError, TypeError, ValueError):
+        if not cursor:
+            raise
+        raise CursorInvalido("Cursor inválido.")
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar([_valor(filas[-1], campo.lstrip('-')) for campo in orden])
+    return filas, siguiente
@@ -0,0 +1,210 @@
+# usuarios/planes.py
+"""
+Auditoría de índices de las consultas más usadas (manage.py auditar_consultas).
+
+Cada consulta del registro reproduce la que hace una vista o un servicio, con
+parámetros de ejemplo. Se pide su plan (EXPLAIN QUERY PLAN en SQLite, EXPLAIN
+en PostgreSQL) y se marcan las tablas que se recorren completas. En
+PostgreSQL se desactiva el recorrido secuencial durante el EXPLAIN: con
+tablas pequeñas el planificador lo prefiere aunque exista el índice, y así
+solo aparece cuando ningún índice sirve.
+"""
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+CONSULTAS = {}
+
+Auditoria = namedtuple('Auditoria', ['nombre', 'plan', 'escaneos'])
+
+# "SCAN usuarios_producto" sin índice (SQLite) / "Seq Scan on usuarios_producto" (PostgreSQL)
+ESCANEO_SQLITE = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+ESCANEO_POSTGRESQL = re.compile(r'Seq Scan on (\w+)')
+
+
+def consulta(nombre, permitir=()):
+    """
+    Registra una función que devuelve el queryset de una consulta frecuente.
+    `permitir` son tablas pequeñas (p. ej. las habitaciones) en las que
+    recorrer la tabla completa es lo esperado.
+    """
+    def decorador(func):
+        func.permitir = set(permitir)
+        CONSULTAS[nombre] = func
+        return func
+    return decorador
+
+
+def plan(queryset):
+    """Líneas del plan de ejecución del queryset en la base actual."""
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain().splitlines()
+    return queryset.explain().splitlines()
+
+
+def escaneos(lineas):
+    """Tablas que el plan recorre completas (sin índice)."""
+    patron = ESCANEO_POSTGRESQL if connection.vendor == 'postgresql' else ESCANEO_SQLITE
+    tablas = []
+    for linea in lineas:
+        encontrado = patron.search(linea.strip())
+        if encontrado and encontrado.group(1) not in tablas:
+            tablas.append(encontrado.group(1))
+    return tablas
+
+
+def auditar(nombres=None):
+    """Devuelve una Auditoria por consulta del registro (todas si no se indican nombres)."""
+    resultados = []
+    for nombre in nombres or CONSULTAS:
+        func = CONSULTAS[nombre]
+        lineas = plan(func())
+        resultados.append(Auditoria(nombre, lineas, [t for t in escaneos(lineas) if t not in func.permitir]))
+    return resultados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+# Registro de consultas frecuentes
+
+@consulta('escaneo_codigo')
+def _escaneo_codigo():
+    from .models import Producto
+    return Producto.objects.filter(codigo='7701234567890')
+
+
+@consulta('catalogo_sincronizacion')
+def _catalogo_sincronizacion():
+    from .models import Producto
+    return Producto.objects.filter(actualizado__gt=timezone.now()).order_by('actualizado', 'id')[:500]
+
+
+@consulta('inventario_categorias')
+def _inventario_categorias():
+    from .models import Producto
+    return Producto.objects.values_list('categoria', flat=True).distinct()
+
+
+@consulta('inventario_por_categoria')
+def _inventario_por_categoria():
+    from .models import Producto
+    return Producto.objects.filter(categoria='Aseo').order_by('nombre')
+
+
+@consulta('reportes_stock_bajo')
+def _reportes_stock_bajo():
+    from .models import Producto
+    return Producto.objects.filter(stock__lte=5)
+
+
+@consulta('historial_ventas')
+def _historial_ventas():
+    from .models import Venta
+    return Venta.objects.order_by('-fecha')[:50]
+
+
+@consulta('reportes_detalle_mes')
+def _reportes_detalle_mes():
+    from .models import DetalleVenta
+    fin = timezone.now()
+    return (
+        DetalleVenta.objects.filter(venta__fecha__gte=fin - timedelta(days=30), venta__fecha__lt=fin)
+        .order_by('-venta__fecha', '-id')[:50]
+    )
+
+
+@consulta('compras_cliente')
+def _compras_cliente():
+    from .models import Compra
+    return Compra.objects.filter(cliente_id=1).select_related('producto').order_by('-fecha_compra')
+
+
+@consulta('proveedores')
+def _proveedores():
+    from . import directorio
+    return directorio.buscar().order_by(*directorio.ORDEN)[:101]
+
+
+@consulta('proveedores_busqueda')
+def _proveedores_busqueda():
+    from . import directorio, paginacion
+    return (
+        directorio.buscar('900').filter(paginacion.despues_de(directorio.ORDEN, ['papeleria', 10]))
+        .order_by(*directorio.ORDEN)[:101]
+    )
+
+
+@consulta('habitaciones_libres', permitir=('usuarios_habitacion',))
+def _habitaciones_libres():
+    from . import disponibilidad
+    return disponibilidad.habitaciones_libres(date(2030, 1, 1), date(2030, 1, 5))
+
+
+@consulta('reservas_solapadas')
+def _reservas_solapadas():
+    from . import disponibilidad
+    return disponibilidad.reservas_solapadas(1, date(2030, 1, 1), date(2030, 1, 5))
+
+
+@consulta('facturacion_pendientes')
+def _facturacion_pendientes():
+    from . import facturacion
+    return facturacion.pendientes(date(2030, 1, 1), date(2030, 1, 1))
+
+
+@consulta('informe_ingresos')
+def _informe_ingresos():
+    from . import ingresos
+    return ingresos.facturas_en_rango(date(2030, 1, 1), date(2030, 1, 31))
+
+
+@consulta('cola_trabajos')
+def _cola_trabajos():
+    from .models import TrabajoReporte
+    from .trabajos import PENDIENTE
+    return TrabajoReporte.objects.filter(estado=PENDIENTE).order_by('id')[:1]
+
+
+@consulta('inventario_pagina')
+def _inventario_pagina():
+    from .models import Producto
+    from .stock import con_estado
+    return con_estado(Producto.objects.all()).order_by('nombre', 'id')[:51]
+
+
+@consulta('inventario_stock_bajo')
+def _inventario_stock_bajo():
+    from .models import Producto
+    from .stock import STOCK_BAJO, con_estado, filtrar_estado
+    return filtrar_estado(con_estado(Producto.objects.all()), STOCK_BAJO).order_by('nombre', 'id')[:51]
+
+
+@consulta('inventario_sin_stock')
+def _inventario_sin_stock():
+    from .models import Producto
+    from .stock import SIN_STOCK, con_estado, filtrar_estado
+    return filtrar_estado(con_estado(Producto.objects.all()), SIN_STOCK).order_by('nombre', 'id')[:51]
+
+
+@consulta('sugerencias_velocidades')
+def _sugerencias_velocidades():
+    from . import reabastecimiento
+    return reabastecimiento.velocidades(date(2030, 1, 1))
+
+
+@consulta('stock_en_fecha')
+def _stock_en_fecha():
+    from . import movimientos
+    from .models import Producto
+    return movimientos.con_stock_libro(Producto.objects.filter(pk=1), timezone.now())
+
+
+@consulta('conciliacion_stock', permitir=('usuarios_producto',))
+def _conciliacion_stock():
+    from . import movimientos
+    from .models import Producto
+    return movimientos.con_stock_libro(Producto.objects.all()).order_by('id')
@@ -0,0 +1,114 @@
+# usuarios/precios.py
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from . import fragmentos, resumenes
+from .models import Venta
+
+CENTAVOS = Decimal('0.01')
+
+LineaPrecio = namedtuple('LineaPrecio', 'producto cantidad precio_unitario subtotal')
+Totales = namedtuple('Totales', 'subtotal iva total')
+
+
+def redondear(valor):
+    return Decimal(valor).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+@lru_cache(maxsize=1)
+def tasa_iva():
+    """Tasa de IVA configurada en settings.IVA_TASA (se lee una sola vez por proceso)."""
+    return Decimal(str(getattr(settings, 'IVA_TASA', '0.19')))
+
+
+def _limpiar_tasa_iva(setting, **kwargs):
+    if setting == 'IVA_TASA':
+        tasa_iva.cache_clear()
+
+
+setting_changed.connect(_limpiar_tasa_iva)
+
+
+def totales_desde_subtotal(subtotal):
+    subtotal = redondear(subtotal)
+    iva = redondear(subtotal * tasa_iva())
+    return Totales(subtotal, iva, subtotal + iva)
+
+
+def calcular_lineas(items, productos):
+    """
+    Calcula en una sola pasada las líneas y los totales de una venta.
+
+    `items` son las líneas del carrito ({'id', 'cantidad'}) y `productos` un
+    diccionario id -> Producto. Los precios salen siempre de Producto.precio,
+    nunca de lo que envía el navegador.
+    """
+    lineas = []
+    subtotal = Decimal('0')
+    for item in items:
+        producto = productos[int(item['id'])]
+        cantidad = int(item['cantidad'])
+        precio = redondear(producto.precio)
+        linea_subtotal = precio * cantidad
+        subtotal += linea_subtotal
+        lineas.append(LineaPrecio(producto, cantidad, precio, linea_subtotal))
+    return lineas, totales_desde_subtotal(subtotal)
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def auditar_ventas(ventas=None, tamano_lote=2000):
+    """
+    Recalcula los totales de muchas ventas históricas por lotes.
+
+    Por cada lote se hace una única consulta agregada que suma
+    precio_unitario * cantidad de los detalles de cada venta. Devuelve una
+    lista de (venta, Totales esperados) solo para las ventas que no cuadran.
+    """
+    if ventas is None:
+        ventas = Venta.objects.all()
+
+    importe_linea = ExpressionWrapper(
+        F('detalles__precio_unitario') * F('detalles__cantidad'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    ids = list(ventas.order_by('id').values_list('id', flat=True))
+    diferencias = []
+
+    for inicio in range(0, len(ids), tamano_lote):
+        lote = (
+            Venta.objects.filter(id__in=ids[inicio:inicio + tamano_lote])
+            .annotate(subtotal_lineas=Sum(importe_linea))
+            .order_by('id')
+        )
+        for venta in lote:
+            esperado = totales_desde_subtotal(venta.subtotal_lineas or 0)
+            if (venta.subtotal, venta.iva, venta.total) != tuple(esperado):
+                diferencias.append((venta, esperado))
+
+    return diferencias
+
+
+def corregir_ventas(diferencias, tamano_lote=2000):
+    """
+    Guarda los totales recalculados por auditar_ventas con bulk_update y, en la
+    misma transacción, reconstruye los resúmenes de los meses de esas ventas.
+    """
+    ventas = []
+    for venta, esperado in diferencias:
+        venta.subtotal, venta.iva, venta.total = esperado
+        ventas.append(venta)
+    if not ventas:
+        return 0
+    fechas = [timezone.localdate(venta.fecha) for venta in ventas]
+    with transaction.atomic():
+        Venta.objects.bulk_update(ventas, ['subtotal', 'iva', 'total'], batch_size=tamano_lote)
+        resumenes.reconstruir(min(fechas), max(fechas))
+    fragmentos.invalidar(fragmentos.VENTAS)  # bulk_update no dispara post_save
+    return len(ventas)
@@ -0,0 +1,106 @@
+# usuarios/reabastecimiento.py
+"""
+Sugerencias de compra por proveedor a partir de la velocidad de venta.
+
+La venta diaria de cada producto se estima con medias móviles sobre las
+ventanas de VENTANAS días, leídas de los resúmenes diarios de ventas
+(ResumenVentaProducto, que se alimenta de cada DetalleVenta y se puede
+reconstruir con `reconstruir_resumenes`). Todas las ventanas de todos los
+productos salen de una sola consulta agregada sobre ProductoProveedor; con
+ellas se calcula el punto de pedido (venta diaria x (días de entrega +
+DIAS_SEGURIDAD), nunca menos que el stock_minimo del producto) y, si el stock
+quedó por debajo, la cantidad para cubrir además DIAS_COBERTURA días,
+redondeada al lote del proveedor.
+
+El comando nocturno `calcular_sugerencias` guarda el resultado en
+SugerenciaCompra para que la oficina lo lea sin recalcular nada.
+"""
+import math
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ProductoProveedor, SugerenciaCompra
+from .resumenes import DIARIO
+from .stock import con_reintentos
+
+# Ventanas de la media móvil (días) y su peso en la venta diaria estimada
+VENTANAS = {7: Decimal('0.6'), 28: Decimal('0.4')}
+DIAS_SEGURIDAD = 3
+DIAS_COBERTURA = 14
+
+
+def velocidades(hoy):
+    """ProductoProveedor principales con las unidades vendidas en cada ventana (`ventana_7`, ...)."""
+    inicio = hoy - timedelta(days=max(VENTANAS))
+    return (
+        ProductoProveedor.objects.filter(principal=True)
+        .annotate(ventas=FilteredRelation(
+            'producto__resumenventaproducto',
+            condition=Q(
+                producto__resumenventaproducto__periodo=DIARIO,
+                producto__resumenventaproducto__fecha__gt=inicio,
+                producto__resumenventaproducto__fecha__lte=hoy,
+            ),
+        ))
+        .annotate(**{
+            f'ventana_{dias}': Coalesce(
+                Sum('ventas__cantidad', filter=Q(ventas__fecha__gt=hoy - timedelta(days=dias))), 0,
+            )
+            for dias in VENTANAS
+        })
+        .values(
+            'producto_id', 'proveedor_id', 'costo', 'dias_entrega', 'lote_minimo',
+            'producto__stock', 'producto__stock_minimo', *[f'ventana_{dias}' for dias in VENTANAS],
+        )
+    )
+
+
+def venta_diaria(fila):
+    return sum(Decimal(fila[f'ventana_{dias}']) / dias * peso for dias, peso in VENTANAS.items())
+
+
+def sugerencia(fila, hoy):
+    """SugerenciaCompra (sin guardar) para una fila de velocidades(), o None si no hace falta pedir."""
+    diaria = venta_diaria(fila)
+    stock = fila['producto__stock']
+    punto_pedido = max(fila['producto__stock_minimo'], math.ceil(diaria * (fila['dias_entrega'] + DIAS_SEGURIDAD)))
+    # Mismo criterio que el estado "bajo stock" del inventario, con el punto de pedido como umbral
+    if stock >= punto_pedido and stock > 0:
+        return None
+    faltante = punto_pedido + math.ceil(diaria * DIAS_COBERTURA) - stock
+    lote = max(fila['lote_minimo'], 1)
+    cantidad = max(lote, math.ceil(faltante / lote) * lote)
+    return SugerenciaCompra(
+        proveedor_id=fila['proveedor_id'], producto_id=fila['producto_id'], fecha=hoy,
+        venta_diaria=diaria.quantize(Decimal('0.01')), stock=stock, punto_pedido=punto_pedido,
+        cantidad=cantidad, costo=fila['costo'], total=fila['costo'] * cantidad,
+    )
+
+
+@con_reintentos
+def precalcular(hoy=None):
+    """Reemplaza todas las sugerencias con las calculadas para `hoy`; devuelve cuántas hay."""
+    hoy = hoy or timezone.localdate()
+    sugerencias = [s for s in (sugerencia(fila, hoy) for fila in velocidades(hoy)) if s is not None]
+    with transaction.atomic():
+        SugerenciaCompra.objects.all().delete()
+        SugerenciaCompra.objects.bulk_create(sugerencias, batch_size=2000)
+    return len(sugerencias)
+
+
+def pedidos_por_proveedor():
+    """Sugerencias guardadas agrupadas por proveedor: [(proveedor, lineas, total)]."""
+    lineas = SugerenciaCompra.objects.select_related('proveedor', 'producto').order_by(
+        'proveedor__nombre', 'proveedor_id', 'producto__nombre',
+    )
+    pedidos = []
+    for _, grupo in groupby(lineas, key=lambda s: s.proveedor_id):
+        grupo = list(grupo)
+        pedidos.append((grupo[0].proveedor, grupo, sum(s.total for s in grupo)))
+    return pedidos
@@ -0,0 +1,83 @@
+# usuarios/reservas.py
+"""
+Creación y cambios de reservas sin sobreventa de habitaciones.
+
+La garantía la da la base de datos: OcupacionNoche tiene una restricción
+única (habitacion, fecha), y las noches se insertan en la misma transacción
+que la reserva, así que de dos reservas concurrentes que se cruzan solo una
+puede confirmarse. En PostgreSQL la migración 0010 añade además una
+restricción EXCLUDE sobre los rangos de fechas de usuarios_reserva. Antes de
+escribir se bloquea la fila de la habitación (donde hay SELECT ... FOR
+UPDATE) y se revisa el calendario para devolver un error claro sin llegar a
+la violación de la restricción.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from . import disponibilidad
+from .models import Habitacion, Reserva
+from .stock import con_reintentos
+
+
+class HabitacionOcupada(Exception):
+    def __init__(self, habitacion, fecha_inicio, fecha_fin):
+        self.habitacion = habitacion
+        super().__init__(
+            f"La habitación {habitacion.numero} ya está reservada entre el {fecha_inicio} y el {fecha_fin}."
+        )
+
+
+class ReservaInvalida(Exception):
+    pass
+
+
+def _bloquear_habitacion(habitacion_id):
+    if connection.features.has_select_for_update:
+        list(Habitacion.objects.select_for_update().filter(id=habitacion_id).values_list('id'))
+
+
+@con_reintentos
+def guardar_reserva(reserva):
+    """Guarda una reserva nueva o modificada; lanza HabitacionOcupada si se cruza con otra."""
+    if reserva.fecha_inicio is None or reserva.fecha_fin is None or reserva.fecha_fin <= reserva.fecha_inicio:
+        raise ReservaInvalida("La fecha de salida debe ser posterior a la de entrada.")
+
+    nueva = reserva.pk is None
+    ocupa = disponibilidad.ocupa(reserva)
+
+    def libre():
+        return disponibilidad.esta_libre(
+            reserva.habitacion_id, reserva.fecha_inicio, reserva.fecha_fin, excluir_reserva=reserva.pk,
+        )
+
+    try:
+        with transaction.atomic():
+            if ocupa:
+                _bloquear_habitacion(reserva.habitacion_id)
+                if not libre():
+                    raise HabitacionOcupada(reserva.habitacion, reserva.fecha_inicio, reserva.fecha_fin)
+            # post_save (signals.py) inserta las noches dentro de esta misma transacción
+            reserva.save()
+    except Exception as error:
+        if nueva:
+            # El INSERT se revirtió: un reintento debe volver a insertar
+            reserva.pk = None
+        # Otra transacción confirmó una reserva cruzada entre la revisión y el INSERT
+        if isinstance(error, IntegrityError) and ocupa and not libre():
+            raise HabitacionOcupada(reserva.habitacion, reserva.fecha_inicio, reserva.fecha_fin) from error
+        raise
+    return reserva
+
+
+def crear_reserva(cliente, habitacion, fecha_inicio, fecha_fin, empleado=None):
+    return guardar_reserva(Reserva(
+        cliente=cliente, habitacion=habitacion, empleado=empleado,
+        fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, estado_reserva=disponibilidad.ACTIVA,
+    ))
+
+
+def cancelar_reserva(reserva):
+    """Cancela la reserva y libera sus noches."""
+    reserva.estado_reserva = 'cancelada'
+    with transaction.atomic():
+        reserva.save(update_fields=['estado_reserva'])
+    return reserva
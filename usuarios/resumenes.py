@@ -0,0 +1,193 @@
+# usuarios/resumenes.py
+"""
+Resúmenes diarios y mensuales de ventas para el tablero de reportes.
+
+Cada venta suma sus importes a ResumenVenta y ResumenVentaProducto dentro de
+la misma transacción que la guarda, con un INSERT ... ON CONFLICT DO UPDATE
+por tabla (SQLite >= 3.24 y PostgreSQL). Así los reportes leen O(días) filas
+en lugar de recorrer todos los DetalleVenta. El comando
+`reconstruir_resumenes` los vuelve a calcular desde cero.
+
+Lo que no pasa por sumar_venta también los mantiene: borrar una venta o un
+detalle descuenta sus importes (restar_venta y restar_detalle, desde
+signals.py) y precios.corregir_ventas reconstruye los meses que corrige.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import DetalleVenta, ResumenVenta, ResumenVentaProducto, Venta
+
+DIARIO = 'D'
+MENSUAL = 'M'
+
+
+def _upsert(modelo, claves, sumas, filas):
+    """INSERT de varias filas que, si la clave ya existe, suma los valores."""
+    if not filas:
+        return
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    columnas = claves + sumas
+    marcadores = "(" + ", ".join(["%s"] * len(columnas)) + ")"
+    actualizar = ", ".join(f"{c} = {tabla}.{c} + excluded.{c}" for c in sumas)
+    por_sentencia = (connection.features.max_query_params or 999) // len(columnas)
+
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), por_sentencia):
+            lote = filas[inicio:inicio + por_sentencia]
+            cursor.execute(
+                f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES {', '.join([marcadores] * len(lote))} "
+                f"ON CONFLICT ({', '.join(claves)}) DO UPDATE SET {actualizar}",
+                [valor for fila in lote for valor in fila],
+            )
+
+
+def sumar_venta(venta, lineas):
+    """
+    Acumula una venta recién creada en los resúmenes del día y del mes.
+
+    `lineas` son objetos con producto, cantidad y subtotal (precios.LineaPrecio
+    o DetalleVenta). Debe llamarse dentro de la transacción de la venta.
+    """
+    dia = timezone.localdate(venta.fecha)
+    periodos = ((DIARIO, dia), (MENSUAL, dia.replace(day=1)))
+
+    _upsert(
+        ResumenVenta, ['periodo', 'fecha'], ['ventas', 'subtotal', 'iva', 'total'],
+        [(p, f, 1, venta.subtotal, venta.iva, venta.total) for p, f in periodos],
+    )
+
+    por_producto = defaultdict(lambda: [0, Decimal('0')])
+    for linea in lineas:
+        acumulado = por_producto[linea.producto.id]
+        acumulado[0] += linea.cantidad
+        acumulado[1] += Decimal(linea.subtotal)
+    _upsert(
+        ResumenVentaProducto, ['periodo', 'fecha', 'producto_id'], ['cantidad', 'importe'],
+        [
+            (p, f, producto_id, cantidad, importe)
+            for p, f in periodos
+            for producto_id, (cantidad, importe) in por_producto.items()
+        ],
+    )
+
+
+def _periodos(fecha):
+    dia = timezone.localdate(fecha)
+    return Q(periodo=DIARIO, fecha=dia) | Q(periodo=MENSUAL, fecha=dia.replace(day=1))
+
+
+def restar_venta(venta):
+    """Descuenta una venta borrada de los resúmenes de su día y de su mes."""
+    resumenes = ResumenVenta.objects.filter(_periodos(venta.fecha))
+    resumenes.update(
+        ventas=F('ventas') - 1,
+        subtotal=F('subtotal') - venta.subtotal,
+        iva=F('iva') - venta.iva,
+        total=F('total') - venta.total,
+    )
+    # Como reconstruir, que no deja filas de días o meses sin ventas
+    resumenes.filter(ventas=0).delete()
+
+
+def restar_detalle(detalle, fecha):
+    """Descuenta un DetalleVenta borrado de los resúmenes por producto."""
+    resumenes = ResumenVentaProducto.objects.filter(_periodos(fecha), producto_id=detalle.producto_id)
+    resumenes.update(
+        cantidad=F('cantidad') - detalle.cantidad,
+        importe=F('importe') - detalle.subtotal,
+    )
+    # Una fila en cero aparecería en ranking_productos como el menos vendido
+    resumenes.filter(cantidad=0).delete()
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def _meses_completos(desde, hasta):
+    """Amplía el rango a meses completos para que los resúmenes mensuales cuadren."""
+    if desde:
+        desde = desde.replace(day=1)
+    if hasta:
+        hasta = hasta.replace(day=calendar.monthrange(hasta.year, hasta.month)[1])
+    return desde, hasta
+
+
+def _filtrar(queryset, campo, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f"{campo}__gte": desde})
+    if hasta:
+        queryset = queryset.filter(**{f"{campo}__lte": hasta})
+    return queryset
+
+
+@transaction.atomic
+def reconstruir(desde=None, hasta=None, tamano_lote=1000):
+    """Recalcula los resúmenes (todo el histórico o los meses entre desde y hasta)."""
+    desde, hasta = _meses_completos(desde, hasta)
+    _filtrar(ResumenVenta.objects.all(), 'fecha', desde, hasta).delete()
+    _filtrar(ResumenVentaProducto.objects.all(), 'fecha', desde, hasta).delete()
+
+    ventas = _filtrar(Venta.objects.all(), 'fecha__date', desde, hasta)
+    detalles = _filtrar(DetalleVenta.objects.all(), 'venta__fecha__date', desde, hasta)
+    creados = 0
+
+    for periodo, truncar in ((DIARIO, TruncDate), (MENSUAL, TruncMonth)):
+        por_venta = (
+            ventas.annotate(dia=truncar('fecha', output_field=DateField()))
+            .values('dia')
+            .annotate(n=Count('id'), s=Sum('subtotal'), i=Sum('iva'), t=Sum('total'))
+            .order_by()
+        )
+        ResumenVenta.objects.bulk_create(
+            (ResumenVenta(periodo=periodo, fecha=f['dia'], ventas=f['n'],
+                          subtotal=f['s'], iva=f['i'], total=f['t'])
+             for f in por_venta.iterator()),
+            batch_size=tamano_lote,
+        )
+
+        por_producto = (
+            detalles.annotate(dia=truncar('venta__fecha', output_field=DateField()))
+            .values('dia', 'producto_id')
+            .annotate(c=Sum('cantidad'), s=Sum('subtotal'))
+            .order_by()
+        )
+        filas = [
+            ResumenVentaProducto(periodo=periodo, fecha=f['dia'], producto_id=f['producto_id'],
+                                 cantidad=f['c'], importe=f['s'])
+            for f in por_producto.iterator()
+        ]
+        ResumenVentaProducto.objects.bulk_create(filas, batch_size=tamano_lote)
+        creados += len(filas)
+
+    return creados
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+def rango_mes(anio, mes):
+    inicio = date(anio, mes, 1)
+    fin = inicio.replace(day=calendar.monthrange(anio, mes)[1])
+    return inicio, fin
+
+
+def ranking_productos(desde=None, hasta=None):
+    """Productos ordenados por unidades vendidas, leyendo solo los resúmenes."""
+    meses_enteros = (desde is None or desde.day == 1) and (
+        hasta is None or (hasta + timedelta(days=1)).day == 1
+    )
+    resumenes = ResumenVentaProducto.objects.filter(periodo=MENSUAL if meses_enteros else DIARIO)
+    return (
+        _filtrar(resumenes, 'fecha', desde, hasta)
+        .values('producto__nombre')
+        .annotate(total_vendido=Sum('cantidad'))
+        .order_by('-total_vendido', 'producto__nombre')
+    )
+
+
+def total_ventas(desde=None, hasta=None):
+    resumenes = _filtrar(ResumenVenta.objects.filter(periodo=DIARIO), 'fecha', desde, hasta)
+    return resumenes.aggregate(n=Sum('ventas'))['n'] or 0
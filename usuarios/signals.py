@@ -0,0 +1,92 @@
+# usuarios/signals.py
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import busqueda, directorio, disponibilidad, fragmentos, ingresos, movimientos, resumenes
+from .indice_codigos import indice
+from .models import DetalleVenta, Factura, Producto, ProductoEliminado, Proveedor, Reserva, Venta
+
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_indice_codigos(sender, instance, **kwargs):
+    indice.invalidar(codigo=instance.codigo, producto_id=instance.id)
+
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_fragmentos_catalogo(sender, **kwargs):
+    fragmentos.invalidar(fragmentos.CATALOGO)
+
+
+@receiver([post_save, post_delete], sender=Venta)
+def invalidar_fragmentos_ventas(sender, **kwargs):
+    fragmentos.invalidar(fragmentos.VENTAS)
+
+
+@receiver(post_delete, sender=Venta)
+def restar_venta_resumenes(sender, instance, **kwargs):
+    resumenes.restar_venta(instance)
+
+
+@receiver(post_delete, sender=DetalleVenta)
+def restar_detalle_resumenes(sender, instance, **kwargs):
+    # Al borrar una venta sus detalles se borran antes que ella: la fecha aún se puede leer
+    fecha = Venta.objects.filter(pk=instance.venta_id).values_list('fecha', flat=True).first()
+    if fecha is not None:
+        resumenes.restar_detalle(instance, fecha)
+
+
+@receiver(post_save, sender=Producto)
+def registrar_stock_inicial(sender, instance, created, raw=False, **kwargs):
+    # Los cambios posteriores los registra quien toca el stock (ver movimientos.py)
+    if created and not raw:
+        movimientos.registrar({instance.id: instance.stock}, movimientos.INICIAL)
+
+
+@receiver(post_delete, sender=Producto)
+def registrar_producto_eliminado(sender, instance, **kwargs):
+    ProductoEliminado.objects.create(producto_id=instance.id, codigo=instance.codigo)
+
+
+@receiver(post_save, sender=Reserva)
+def sincronizar_ocupacion(sender, instance, raw=False, **kwargs):
+    # Al borrar la reserva sus noches se van por CASCADE
+    if not raw:
+        disponibilidad.sincronizar(instance)
+
+
+@receiver(post_save, sender=Reserva)
+def actualizar_fechas_factura(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cambiadas = Factura.objects.filter(reserva=instance).exclude(
+        fecha_inicio=instance.fecha_inicio, fecha_fin=instance.fecha_fin,
+    ).update(fecha_inicio=instance.fecha_inicio, fecha_fin=instance.fecha_fin)
+    if cambiadas:
+        transaction.on_commit(ingresos.invalidar)
+
+
+@receiver(pre_save, sender=Factura)
+def copiar_fechas_reserva(sender, instance, raw=False, **kwargs):
+    # Solo consulta la reserva si falta la copia o si ya viene cargada en la instancia
+    if not raw and instance.reserva_id and (instance.fecha_inicio is None or Factura.reserva.is_cached(instance)):
+        instance.fecha_inicio = instance.reserva.fecha_inicio
+        instance.fecha_fin = instance.reserva.fecha_fin
+
+
+@receiver(pre_save, sender=Proveedor)
+def calcular_clave_proveedor(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.nombre_clave = directorio.clave(instance.nombre)
+
+
+@receiver([post_save, post_delete], sender=Factura)
+def invalidar_informe_ingresos(sender, **kwargs):
+    transaction.on_commit(ingresos.invalidar)
+
+
+@receiver(post_migrate)
+def asegurar_indice_busqueda(sender, app_config, using, **kwargs):
+    # Si una migración reconstruyó usuarios_producto, SQLite borró los triggers del índice FTS
+    if app_config.name == 'usuarios':
+        busqueda.instalar(connections[using], solo_triggers=True)
@@ -0,0 +1,137 @@
+# usuarios/stock.py
+import random
+import time
+from functools import wraps
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils import timezone
+
+from . import fragmentos, movimientos
+from .indice_codigos import indice
+from .models import Producto
+
+# Cantidad máxima de productos por sentencia UPDATE (límite de expresiones en SQLite)
+TAMANO_LOTE_STOCK = 200
+
+# Estados de stock del inventario; cada uno con su condición para filtrar en SQL
+# ("bajo stock" coincide con el índice parcial producto_stock_bajo_idx)
+SIN_STOCK, STOCK_BAJO, STOCK_OK = 'empty', 'low', 'ok'
+ESTADOS_STOCK = {
+    SIN_STOCK: Q(stock=0),
+    STOCK_BAJO: Q(stock__gt=0, stock__lt=F('stock_minimo')),
+    STOCK_OK: Q(stock__gt=0, stock__gte=F('stock_minimo')),
+}
+
+# Reintentos cuando SQLite responde "database is locked"
+REINTENTOS_MAXIMOS = 8
+ESPERA_BASE = 0.02
+ESPERA_MAXIMA = 1.0
+
+
+class StockInsuficiente(Exception):
+    """Algún producto no tiene stock suficiente; la operación se rechaza completa."""
+
+    def __init__(self, productos):
+        self.productos = productos
+        nombres = ", ".join(f"'{p.nombre}' (disponible: {p.stock})" for p in productos)
+        super().__init__(f"Stock insuficiente para {nombres}.")
+
+
+def es_bloqueo(error):
+    mensaje = str(error).lower()
+    return 'database is locked' in mensaje or 'database table is locked' in mensaje
+
+
+def con_reintentos(func):
+    """
+    Reintenta la transacción completa con espera exponencial si la base está bloqueada.
+
+    Solo reintenta cuando no hay una transacción externa abierta: dentro de un
+    atomic() ajeno el error se propaga para que lo maneje quien lo abrió.
+    """
+    @wraps(func)
+    def envoltura(*args, **kwargs):
+        intento = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if not es_bloqueo(error) or connection.in_atomic_block or intento >= REINTENTOS_MAXIMOS:
+                    raise
+                espera = min(ESPERA_MAXIMA, ESPERA_BASE * (2 ** intento))
+                time.sleep(espera * random.uniform(0.5, 1.5))
+                intento += 1
+    return envoltura
+
+
+def bloquear_productos(ids):
+    """Bloquea las filas (SELECT ... FOR UPDATE) en los motores que lo soportan."""
+    if connection.features.has_select_for_update:
+        list(Producto.objects.select_for_update().filter(id__in=ids).order_by('id').values_list('id'))
+
+
+def descontar(cantidades, tipo=movimientos.VENTA, referencia=''):
+    """
+    Descuenta stock de forma atómica: {producto_id: cantidad}.
+
+    Debe llamarse dentro de transaction.atomic(). Cada lote es una sola
+    sentencia UPDATE que solo toca las filas con stock suficiente; si el
+    número de filas actualizadas no coincide se lanza StockInsuficiente y la
+    transacción se revierte. Las salidas quedan en el libro de movimientos
+    con `tipo` y `referencia`.
+    """
+    ids = sorted(cantidades)
+    bloquear_productos(ids)
+    # Los UPDATE no disparan post_save: invalidar el índice del escáner al confirmar
+    transaction.on_commit(lambda: indice.invalidar_ids(ids))
+    fragmentos.invalidar(fragmentos.CATALOGO)
+
+    for inicio in range(0, len(ids), TAMANO_LOTE_STOCK):
+        lote = ids[inicio:inicio + TAMANO_LOTE_STOCK]
+        condicion = Q()
+        casos = []
+        for producto_id in lote:
+            cantidad = cantidades[producto_id]
+            condicion |= Q(id=producto_id, stock__gte=cantidad)
+            casos.append(When(id=producto_id, then=F('stock') - cantidad))
+
+        actualizados = Producto.objects.filter(condicion).update(
+            stock=Case(*casos), actualizado=timezone.now()
+        )
+        if actualizados != len(lote):
+            actuales = Producto.objects.in_bulk(lote)
+            raise StockInsuficiente([p for p in actuales.values() if p.stock < cantidades[p.id]])
+
+    movimientos.registrar({producto_id: -cantidad for producto_id, cantidad in cantidades.items()}, tipo, referencia)
+
+
+@con_reintentos
+def descontar_producto(producto, cantidad, tipo=movimientos.VENTA, referencia=''):
+    """Descuenta stock de un solo producto en su propia transacción y lo refresca."""
+    with transaction.atomic():
+        descontar({producto.id: cantidad}, tipo, referencia)
+    producto.refresh_from_db(fields=['stock'])
+    return producto
+
+
+def con_estado(productos):
+    """Anota `estado` (empty/low/ok) según el stock y el stock_minimo de cada producto."""
+    return productos.annotate(estado=Case(
+        When(ESTADOS_STOCK[SIN_STOCK], then=Value(SIN_STOCK)),
+        When(ESTADOS_STOCK[STOCK_BAJO], then=Value(STOCK_BAJO)),
+        default=Value(STOCK_OK),
+        output_field=CharField(),
+    ))
+
+
+def filtrar_estado(productos, estado):
+    return productos.filter(ESTADOS_STOCK[estado])
+
+
+def fijar_stock_minimo(minimo, categoria=None):
+    """Fija el stock mínimo de todos los productos o de una categoría con un solo UPDATE."""
+    productos = Producto.objects.all() if categoria is None else Producto.objects.filter(categoria=categoria)
+    actualizados = productos.update(stock_minimo=minimo)
+    fragmentos.invalidar(fragmentos.CATALOGO)  # cambia el estado de stock del inventario
+    return actualizados
@@ -0,0 +1,39 @@
+from django import template
+
+from .. import fragmentos
+
+register = template.Library()
+
+
+class NodoFragmento(template.Node):
+    def __init__(self, nodelist, nombre, fuentes, valores):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.fuentes = fuentes
+        self.valores = valores
+
+    def render(self, context):
+        nombre = self.nombre.resolve(context)
+        fuentes = [f for f in (self.fuentes.resolve(context) or '').split(',') if f]
+        desconocidas = [f for f in fuentes if f not in fragmentos.FUENTES]
+        if desconocidas:
+            raise template.TemplateSyntaxError(f"Fuentes de fragmento desconocidas: {', '.join(desconocidas)}")
+        valores = [valor.resolve(context) for valor in self.valores]
+        return fragmentos.obtener(nombre, fuentes, valores, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def fragmento(parser, token):
+    """
+    {% fragmento "nombre" "catalogo,ventas" valor1 valor2 %} ... {% endfragmento %}
+
+    Guarda el HTML del bloque hasta que cambie alguna de las fuentes (separadas
+    por comas; "" si no depende de ninguna) o cualquiera de los valores.
+    """
+    partes = token.split_contents()
+    if len(partes) < 3:
+        raise template.TemplateSyntaxError(f"'{partes[0]}' necesita un nombre y sus fuentes.")
+    nodelist = parser.parse(('endfragmento',))
+    parser.delete_first_token()
+    nombre, fuentes, *valores = [parser.compile_filter(parte) for parte in partes[1:]]
+    return NodoFragmento(nodelist, nombre, fuentes, valores)
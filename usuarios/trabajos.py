@@ -0,0 +1,185 @@
+# usuarios/trabajos.py
+"""
+Cola de trabajos en segundo plano guardada en la base de datos.
+
+Las vistas encolan un TrabajoReporte y responden de inmediato con su id; los
+procesos lanzados con `python manage.py procesar_trabajos` toman los
+pendientes, informan el progreso y dejan el resultado en disco. Tomar un
+trabajo cuenta los que están en proceso y marca el pendiente más antiguo
+dentro de una transacción serializada con los demás trabajadores (en
+PostgreSQL con un candado de asesoría, en SQLite con BEGIN IMMEDIATE), así que
+dos trabajadores no toman el mismo ni se superan REPORTES_PDF_CONCURRENTES
+renders simultáneos.
+"""
+import io
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from . import metricas
+from .models import Producto, ResumenVenta, ResumenVentaProducto, TrabajoReporte
+from .resumenes import MENSUAL
+from .stock import con_reintentos
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+TERMINADO = 'terminado'
+FALLIDO = 'fallido'
+
+TAREAS = {}
+
+# Clave del pg_advisory_xact_lock que serializa tomar() entre trabajadores
+CANDADO_COLA = 7_310_001
+
+logger = logging.getLogger(__name__)
+
+
+def tarea(tipo):
+    """Registra la función que ejecuta los trabajos de un tipo."""
+    def decorador(func):
+        TAREAS[tipo] = func
+        return func
+    return decorador
+
+
+def concurrentes():
+    return getattr(settings, 'REPORTES_PDF_CONCURRENTES', 2)
+
+
+def directorio():
+    return Path(getattr(settings, 'REPORTES_DIR', Path(settings.BASE_DIR) / 'cache' / 'reportes'))
+
+
+def encolar(usuario, tipo, parametros=None):
+    if tipo not in TAREAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    return TrabajoReporte.objects.create(usuario=usuario, tipo=tipo, parametros=parametros or {})
+
+
+def _bloquear_cola():
+    """
+    Serializa tomar() hasta el final de la transacción. En SQLite no hace falta:
+    BEGIN IMMEDIATE (settings.DATABASES) ya deja entrar a un solo escritor.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CANDADO_COLA])
+
+
+@con_reintentos
+def tomar(trabajador, maximo=None):
+    """Marca como en proceso el pendiente más antiguo, o devuelve None si no hay o se llegó al límite."""
+    maximo = maximo or concurrentes()
+    with transaction.atomic():
+        # Contar y marcar dentro del candado: con un UPDATE condicionado, en READ
+        # COMMITTED dos trabajadores pueden ver el mismo conteo y pasar ambos
+        _bloquear_cola()
+        if TrabajoReporte.objects.filter(estado=EN_PROCESO).count() >= maximo:
+            return None
+        candidato = TrabajoReporte.objects.filter(estado=PENDIENTE).order_by('id').first()
+        if candidato is None:
+            return None
+        candidato.estado, candidato.trabajador = EN_PROCESO, trabajador
+        candidato.iniciado, candidato.progreso = timezone.now(), 0
+        candidato.save(update_fields=['estado', 'trabajador', 'iniciado', 'progreso'])
+    return candidato
+
+
+def liberar_colgados(tiempo_maximo=None):
+    """Devuelve a la cola los trabajos de trabajadores que murieron a mitad del render."""
+    tiempo_maximo = tiempo_maximo or getattr(settings, 'TRABAJOS_TIEMPO_MAXIMO', 900)
+    limite = timezone.now() - timedelta(seconds=tiempo_maximo)
+    return TrabajoReporte.objects.filter(estado=EN_PROCESO, iniciado__lt=limite).update(
+        estado=PENDIENTE, trabajador='', progreso=0,
+    )
+
+
+def ejecutar(trabajo):
+    def avance(porcentaje):
+        TrabajoReporte.objects.filter(id=trabajo.id).update(progreso=porcentaje)
+
+    try:
+        archivo = TAREAS[trabajo.tipo](trabajo, avance)
+    except Exception as error:
+        logger.exception("Falló el trabajo %s", trabajo.id)
+        TrabajoReporte.objects.filter(id=trabajo.id).update(
+            estado=FALLIDO, mensaje=str(error)[:255], terminado=timezone.now(),
+        )
+        return False
+    TrabajoReporte.objects.filter(id=trabajo.id).update(
+        estado=TERMINADO, progreso=100, archivo=str(archivo), terminado=timezone.now(),
+    )
+    return True
+
+
+def trabajar(trabajador, una_vez=False, espera=1.0):
+    """Bucle de un trabajador. Con `una_vez` termina cuando no queda nada que tomar."""
+    procesados = 0
+    liberar_colgados()
+    while True:
+        trabajo = tomar(trabajador)
+        if trabajo is None:
+            if una_vez:
+                return procesados
+            time.sleep(espera)
+            continue
+        try:
+            ejecutar(trabajo)
+        except BaseException:
+            # Interrumpido (Ctrl+C, kill): que otro trabajador lo retome
+            TrabajoReporte.objects.filter(id=trabajo.id).update(estado=PENDIENTE, trabajador='', progreso=0)
+            raise
+        procesados += 1
+
+
+def guardar(nombre, contenido):
+    """Escribe el archivo de resultado de forma atómica y devuelve su ruta."""
+    destino = directorio() / nombre
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, destino)
+    return destino
+
+
+#/////////////////////////////////////////////////////////////////////////////////
+@tarea('reporte_pdf')
+def generar_reporte_pdf(trabajo, avance):
+    """Reporte general de productos con las unidades vendidas de cada uno."""
+    # Unidades vendidas desde los resúmenes mensuales en lugar de sumar todo DetalleVenta
+    vendidos = dict(
+        ResumenVentaProducto.objects.filter(periodo=MENSUAL).order_by()
+        .values_list('producto_id').annotate(total=Sum('cantidad'))
+    )
+    productos = []
+    for producto in Producto.objects.order_by('nombre').iterator(chunk_size=2000):
+        producto.total_vendido = vendidos.get(producto.id)
+        productos.append(producto)
+    productos.sort(key=lambda p: p.total_vendido or 0, reverse=True)
+    avance(30)
+
+    html = get_template('usuarios/reportes_pdf.html').render({
+        'productos': productos,
+        'producto_mas_vendido': productos[0] if productos and productos[0].total_vendido else None,
+        'total_ventas': ResumenVenta.objects.filter(periodo=MENSUAL).aggregate(t=Sum('total'))['t'] or 0,
+    })
+    avance(50)
+
+    salida = io.BytesIO()
+    with metricas.medir('pdf'):
+        estado = pisa.CreatePDF(html, dest=salida)
+    if estado.err:
+        raise RuntimeError("Error al generar el PDF")
+    avance(90)
+    return guardar(f"reporte_{trabajo.id}.pdf", salida.getvalue())
@@ -14,15 +14,28 @@ urlpatterns = [
     path('compras/', views.registrar_venta, name='compras'),
     path('reportes/', views.reportes, name='reportes'),  # Ruta para reportes
     path('reporte/pdf/', views.reporte_pdf, name='reporte_pdf'),
+    path('reporte/trabajos/<int:trabajo_id>/', views.estado_trabajo, name='estado_trabajo'),
+    path('reporte/trabajos/<int:trabajo_id>/descargar/', views.descargar_trabajo, name='descargar_trabajo'),
+    path('reporte/excel/', views.reporte_excel, name='reporte_excel'),
+    path('reporte/csv/', views.reporte_csv, name='reporte_csv'),
 
     # CRUD de productos
     path('productos/guardar/', views.agregar_producto, name='agregar_producto'),
     path('productos/eliminar/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
+    path('productos/importar/', views.importar_productos, name='importar_productos'),
+    path('productos/exportar/', views.exportar_productos, name='exportar_productos'),
  
     # Las APIs para la venta se mantienen igual
     path('api/buscar_producto/', views.buscar_producto_por_codigo, name='buscar_producto_codigo'),
+    path('api/buscar_producto/estadisticas/', views.estadisticas_indice_codigos, name='estadisticas_indice_codigos'),
+    path('api/fragmentos/estadisticas/', views.estadisticas_fragmentos, name='estadisticas_fragmentos'),
+    path('metrics', views.metricas_prometheus, name='metricas_prometheus'),
     path('api/guardar_venta/', views.guardar_venta, name='guardar_venta'),
     path('api/listar_productos/', views.listar_todos_los_productos_api, name='listar_productos_api'),
+    path('api/habitaciones_disponibles/', views.habitaciones_disponibles, name='habitaciones_disponibles'),
+    path('api/reservar/', views.reservar_habitacion, name='reservar_habitacion'),
+    path('api/proveedores/', views.api_proveedores, name='api_proveedores'),
+    path('informe_ingresos/', views.generar_informe_ingresos, name='generar_informe_ingresos'),
 
 
 
@@ -30,6 +43,8 @@ urlpatterns = [
 
     # Rutas para gestionar proveedores
     path('proveedores/', views.proveedores, name='proveedores'),
+    path('proveedores/importar/', views.importar_proveedores, name='importar_proveedores'),
+    path('proveedores/sugerencias/', views.sugerencias_compra, name='sugerencias_compra'),
     path('proveedores/eliminar/<int:proveedor_id>/', views.eliminar_proveedor, name='eliminar_proveedor'),
 
 path('facturas/', views.dashboard, name='facturas_placeholder'),
@@ -0,0 +1,82 @@
+# usuarios/ventas.py
+from collections import OrderedDict
+
+from django.db import transaction
+
+from . import movimientos
+from .models import Producto, Venta, DetalleVenta
+from .precios import calcular_lineas
+from .resumenes import sumar_venta
+from .stock import StockInsuficiente, con_reintentos, descontar
+
+
+class VentaInvalida(Exception):
+    """La venta no se puede registrar (carrito vacío o productos inexistentes)."""
+
+
+def agrupar_cantidades(items):
+    """Suma las cantidades del carrito por producto conservando el orden de llegada."""
+    cantidades = OrderedDict()
+    for item in items:
+        producto_id = int(item['id'])
+        cantidad = int(item['cantidad'])
+        if cantidad <= 0:
+            raise VentaInvalida("Las cantidades deben ser mayores que cero.")
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def procesar_venta(items, usuario, caja='1'):
+    """
+    Registra una venta completa en una sola transacción.
+
+    Carga todos los productos del carrito en una consulta, calcula precios y
+    totales en el servidor, crea los detalles con bulk_create y descuenta el
+    stock con UPDATE condicionales. Si algún producto no existe o no tiene
+    stock, no se guarda nada.
+    """
+    if not items:
+        raise VentaInvalida("No hay productos en la venta.")
+
+    cantidades = agrupar_cantidades(items)
+    return _guardar_venta(items, cantidades, usuario, caja)
+
+
+@con_reintentos
+def _guardar_venta(items, cantidades, usuario, caja):
+    with transaction.atomic():
+        productos = Producto.objects.in_bulk(list(cantidades))
+        faltantes = [str(i) for i in cantidades if i not in productos]
+        if faltantes:
+            raise VentaInvalida(f"Productos no encontrados: {', '.join(faltantes)}.")
+
+        sin_stock = [productos[i] for i, c in cantidades.items() if productos[i].stock < c]
+        if sin_stock:
+            raise StockInsuficiente(sin_stock)
+
+        lineas, totales = calcular_lineas(items, productos)
+
+        venta = Venta.objects.create(
+            subtotal=totales.subtotal,
+            iva=totales.iva,
+            total=totales.total,
+            cajero=usuario.username,
+            vendedor=usuario.username,
+            caja=caja,
+        )
+
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(
+                venta=venta,
+                producto=linea.producto,
+                cantidad=linea.cantidad,
+                precio_unitario=linea.precio_unitario,
+                subtotal=linea.subtotal,
+            )
+            for linea in lineas
+        ])
+
+        descontar(cantidades, movimientos.VENTA, f"venta {venta.id}")
+        sumar_venta(venta, lineas)
+
+    return venta
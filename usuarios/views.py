@@ -1,26 +1,37 @@
 from datetime import date
 import json
 
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, FileResponse, Http404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, UpdateView, DeleteView
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, condition
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.core.paginator import Paginator
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Q  # Importación necesaria para consultas complejas
 from django.template.loader import get_template
-from .forms import CustomUserCreationForm, ReservaForm
-from .models import Reserva, Cliente, Factura, Compra, Producto, Venta, DetalleVenta, Proveedor
+from .forms import BuscarHabitacionForm, CustomUserCreationForm, ReservaForm
+from .models import Reserva, Cliente, Factura, Compra, Producto, Venta, DetalleVenta, Proveedor, TrabajoReporte
+from .ventas import procesar_venta
+from .stock import (
+    SIN_STOCK, STOCK_BAJO, STOCK_OK, StockInsuficiente, con_estado, descontar, descontar_producto, filtrar_estado,
+)
+from .precios import tasa_iva
+from .indice_codigos import indice
+from . import (
+    busqueda, catalogo, directorio, disponibilidad, exportacion, facturas_pdf, fragmentos, importacion, ingresos,
+    metricas, movimientos, paginacion, reabastecimiento, reservas, resumenes, trabajos,
+)
 from xhtml2pdf import pisa
 import io
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db.models import Sum, F
 
 
@@ -100,15 +111,7 @@ def gestionar_productos(request):
 @login_required
 def listar_productos(request):
     query = request.GET.get('q')
-    productos = Producto.objects.all()
-
-    if query:
-        productos = productos.filter(
-            Q(codigo__icontains=query) |
-            Q(nombre__icontains=query) |
-            Q(categoria__icontains=query) |
-            Q(id__icontains=query)
-        )
+    productos = busqueda.buscar(Producto.objects.all(), query, incluir_id=True)
 
     return render(request, 'usuarios/productos.html', {
         'productos': productos,
@@ -139,7 +142,8 @@ def agregar_producto(request):
             producto.stock = stock
             producto.precio = precio
             producto.categoria = categoria
-            producto.save()
+            # Guarda y deja en el libro de movimientos la diferencia de stock
+            movimientos.guardar_con_ajuste(producto)
             messages.success(request, f"✅ Producto '{producto.nombre}' actualizado correctamente.")
 
         else:  # Crear nuevo producto
@@ -163,6 +167,43 @@ def agregar_producto(request):
     return render(request, 'usuarios/productos.html', {'productos': productos})
 
 
+MAXIMO_ERRORES_IMPORTACION = 20  # errores por fila que se muestran como mensajes
+
+
+@login_required
+@require_POST
+def importar_productos(request):
+    """Carga masiva del catálogo desde CSV/XLSX (ver importacion.py)."""
+    archivo = request.FILES.get('archivo')
+    if not archivo:
+        messages.error(request, "⚠️ Selecciona un archivo .csv o .xlsx.")
+        return redirect('productos')
+
+    try:
+        resultado = importacion.importar(archivo, archivo.name)
+    except importacion.ArchivoInvalido as e:
+        messages.error(request, f"⚠️ {e}")
+        return redirect('productos')
+
+    messages.success(
+        request,
+        f"✅ Importación terminada: {resultado.creados} creados, {resultado.actualizados} actualizados.",
+    )
+    for error in resultado.errores[:MAXIMO_ERRORES_IMPORTACION]:
+        messages.error(request, f"⚠️ Fila {error.fila} ({error.codigo or 'sin código'}): {error.mensaje}")
+    if resultado.errores_totales > MAXIMO_ERRORES_IMPORTACION:
+        messages.error(request, f"⚠️ ... y {resultado.errores_totales - MAXIMO_ERRORES_IMPORTACION} filas más con errores.")
+    return redirect('productos')
+
+
+@login_required
+def exportar_productos(request):
+    formato = request.GET.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        return HttpResponseBadRequest("Formato inválido.")
+    return _respuesta_exportacion(formato, 'productos', 'productos')
+
+
 @login_required
 def eliminar_producto(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id)
@@ -192,22 +233,21 @@ def gestionar_compras(request):
 
         producto = get_object_or_404(Producto, id=producto_id)
 
-        if producto.stock < cantidad:
+        # Descontar el stock y crear la compra en una sola transacción: si la
+        # compra no se guarda, el stock y el libro de movimientos vuelven atrás
+        try:
+            with transaction.atomic():
+                descontar({producto.id: cantidad}, movimientos.COMPRA, f"cliente {cliente.id}")
+                Compra.objects.create(
+                    cliente=cliente,
+                    producto=producto,
+                    cantidad=cantidad,
+                    total=total
+                )
+        except StockInsuficiente:
             messages.error(request, f"❌ Stock insuficiente para '{producto.nombre}'.")
             return redirect('compras')
 
-        # Actualizar stock
-        producto.stock -= cantidad
-        producto.save()
-
-        # Crear compra
-        Compra.objects.create(
-            cliente=cliente,
-            producto=producto,
-            cantidad=cantidad,
-            total=total
-        )
-
         messages.success(request, f"✅ Compra registrada: {cantidad} x '{producto.nombre}'.")
         return redirect('compras')
 
@@ -236,17 +276,15 @@ def comprar_producto(request, producto_id):
     cliente, _ = Cliente.objects.get_or_create(usuario=usuario)
     producto = get_object_or_404(Producto, id=producto_id)
 
-    # Verificar que haya stock disponible
-    if producto.stock <= 0:
-        messages.error(request, f"❌ El producto '{producto.nombre}' no tiene stock disponible.")
-        return redirect('compras')
-
     # Cantidad comprada (por ahora asumimos 1 unidad)
     cantidad = 1
 
-    # Restar del inventario
-    producto.stock -= cantidad
-    producto.save()
+    # Restar del inventario verificando que haya stock disponible
+    try:
+        descontar_producto(producto, cantidad, movimientos.COMPRA, f"cliente {cliente.id}")
+    except StockInsuficiente:
+        messages.error(request, f"❌ El producto '{producto.nombre}' no tiene stock disponible.")
+        return redirect('compras')
 
     # Mostrar mensaje de confirmación
     messages.success(request, f"✅ Has comprado '{producto.nombre}'. Stock restante: {producto.stock}.")
@@ -255,30 +293,40 @@ def comprar_producto(request, producto_id):
 
 
 
-@login_required
-def generar_factura_pdf(request, venta_id):
-    """Genera una factura térmica en PDF basada en una venta."""
-    venta = get_object_or_404(Venta, id=venta_id)
-    detalles = DetalleVenta.objects.filter(venta=venta)
+def _venta_factura(request, venta_id):
+    # condition() pide ETag y Last-Modified por separado: una sola consulta por request
+    if not hasattr(request, '_venta_factura'):
+        request._venta_factura = Venta.objects.filter(id=venta_id).first()
+    return request._venta_factura
 
-    template_path = 'usuarios/factura_venta.html'
-    context = {
-        'venta': venta,
-        'detalles': detalles,
-        'user': request.user
-    }
 
-    # Renderizar el template HTML a PDF
-    template = get_template(template_path)
-    html = template.render(context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="factura_{venta.id}.pdf"'
+def _etag_factura(request, venta_id):
+    venta = _venta_factura(request, venta_id)
+    return facturas_pdf.clave(venta) if venta else None
 
-    # Crear el PDF con xhtml2pdf
-    pisa_status = pisa.CreatePDF(io.BytesIO(html.encode('UTF-8')), dest=response, encoding='UTF-8')
 
-    if pisa_status.err:
+def _fecha_factura(request, venta_id):
+    venta = _venta_factura(request, venta_id)
+    return venta.fecha if venta else None
+
+
+@login_required
+@condition(etag_func=_etag_factura, last_modified_func=_fecha_factura)
+def generar_factura_pdf(request, venta_id):
+    """Factura térmica en PDF de una venta, servida desde la caché en disco."""
+    venta = _venta_factura(request, venta_id)
+    if venta is None:
+        raise Http404("Venta no encontrada")
+
+    try:
+        ruta = facturas_pdf.obtener(venta)
+    except facturas_pdf.ErrorPDF:
         return HttpResponse('Error al generar el PDF', status=500)
+
+    response = FileResponse(open(ruta, 'rb'), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="factura_{venta.id}.pdf"'
+    # Privado (requiere sesión) pero revalidable con ETag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
@@ -304,6 +352,41 @@ def visualizar_facturas(request):
     })
 
 
+# Habitaciones libres para un rango de fechas (calendario de ocupación, ver disponibilidad.py)
+@login_required
+def habitaciones_disponibles(request):
+    form = BuscarHabitacionForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errores': form.errors}, status=400)
+
+    habitaciones = disponibilidad.habitaciones_libres(
+        form.cleaned_data['check_in'], form.cleaned_data['check_out']
+    ).order_by('numero').values('id', 'numero', 'tipo', 'capacidad', 'precio_por_noche')
+    return JsonResponse({'habitaciones': list(habitaciones)})
+
+
+# Crear una reserva sin riesgo de sobreventa (ver reservas.py)
+@login_required
+@require_POST
+def reservar_habitacion(request):
+    cliente = Cliente.objects.filter(usuario=request.user).first()
+    if not cliente:
+        return JsonResponse({'status': 'error', 'message': 'Tu usuario no está asociado a ningún cliente.'}, status=400)
+
+    form = ReservaForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errores': form.errors}, status=400)
+
+    reserva = form.save(commit=False)
+    reserva.cliente = cliente
+    reserva.estado_reserva = 'reservada'
+    try:
+        reservas.guardar_reserva(reserva)
+    except reservas.HabitacionOcupada as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+    return JsonResponse({'status': 'success', 'reserva_id': reserva.id}, status=201)
+
+
 # Vista para generar una factura
 @login_required(login_url='iniciar_sesion')
 def generar_factura(request):
@@ -347,27 +430,42 @@ def generar_factura(request):
 
 
 # Vista para generar un informe de ingresos
+FACTURAS_EN_INFORME = 50  # facturas listadas debajo de los totales
+
+
 @login_required(login_url='iniciar_sesion')
 def generar_informe_ingresos(request):
     total_ingresos = None
+    informe = None
     facturas_filtradas = []
+    datos = request.POST if request.method == 'POST' else request.GET
+    agrupacion = datos.get('agrupacion', 'dia')
 
-    if request.method == 'POST':
-        fecha_inicio = request.POST.get('start-date')
-        fecha_fin = request.POST.get('end-date')
-
-        if fecha_inicio and fecha_fin:
-            facturas_filtradas = Factura.objects.filter(
-                reserva__fecha_inicio__gte=fecha_inicio,
-                reserva__fecha_fin__lte=fecha_fin
-            )
-            total_ingresos = facturas_filtradas.aggregate(Sum('total'))['total__sum'] or 0
+    fecha_inicio = datos.get('start-date')
+    fecha_fin = datos.get('end-date')
+    if fecha_inicio and fecha_fin:
+        try:
+            desde, hasta = date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin)
+            informe = ingresos.informe(desde, hasta, agrupacion)
+        except ValueError:
+            messages.error(request, "Fechas o agrupación inválidas.")
         else:
-            messages.error(request, "Por favor selecciona ambas fechas.")
+            total_ingresos = informe['total']
+            facturas_filtradas = (
+                ingresos.facturas_en_rango(desde, hasta)
+                .select_related('reserva__habitacion')
+                .order_by('fecha_inicio', 'id')[:FACTURAS_EN_INFORME]
+            )
+    elif request.method == 'POST':
+        messages.error(request, "Por favor selecciona ambas fechas.")
 
     return render(request, 'usuarios/generar_informe_ingresos.html', {
         'facturas': facturas_filtradas,
-        'total_ingresos': total_ingresos
+        'total_ingresos': total_ingresos,
+        'informe': informe,
+        'agrupacion': agrupacion,
+        'start_date': fecha_inicio,
+        'end_date': fecha_fin,
     })
 
 
@@ -383,70 +481,96 @@ def pagar_factura(request, factura_id):
     return redirect('visualizar_facturas')
 
 
+FILAS_POR_PAGINA_INVENTARIO = 50
+ESTADOS_INVENTARIO = [(SIN_STOCK, 'Sin stock'), (STOCK_BAJO, 'Bajo stock'), (STOCK_OK, 'Suficiente')]
+
+
 @login_required
 def gestionar_inventario(request):
     # Obtener parámetros de búsqueda y filtrado
     search_query = request.GET.get('search', '')
     categoria_filter = request.GET.get('categoria', '')
-    
-    # Consultar productos
-    productos = Producto.objects.all()
-    
+    estado_filter = request.GET.get('estado', '')
+
+    # Consultar productos con el estado del stock calculado en la consulta
+    productos = con_estado(Producto.objects.all())
+
     # Aplicar búsqueda
-    if search_query:
-        productos = productos.filter(
-            models.Q(nombre__icontains=search_query) |
-            models.Q(codigo__icontains=search_query)
-        )
-    
+    productos = busqueda.buscar(productos, search_query)
+
     # Aplicar filtro por categoría
     if categoria_filter:
         productos = productos.filter(categoria=categoria_filter)
-    
+
+    # Filtrar por estado (usa los índices parciales de sin stock / bajo stock)
+    if estado_filter in dict(ESTADOS_INVENTARIO):
+        productos = filtrar_estado(productos, estado_filter)
+
     # Obtener categorías únicas para el filtro
     categorias = Producto.objects.values_list('categoria', flat=True).distinct()
-    
-    # Determinar el estado del stock
-    for producto in productos:
-        if producto.stock == 0:
-            producto.estado = 'empty'
-        elif producto.stock < 10:  # Puedes ajustar este valor según tus necesidades
-            producto.estado = 'low'
-        else:
-            producto.estado = 'ok'
-    
+
+    # Una página por clave (nombre, id)
+    try:
+        pagina, siguiente = paginacion.paginar(
+            productos, ['nombre', 'id'], cursor=request.GET.get('despues'), limite=FILAS_POR_PAGINA_INVENTARIO,
+        )
+    except paginacion.CursorInvalido:
+        pagina, siguiente = paginacion.paginar(productos, ['nombre', 'id'], limite=FILAS_POR_PAGINA_INVENTARIO)
+
+    # Parámetros actuales para el enlace de la página siguiente
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+
     context = {
-        'productos': productos,
+        'productos': pagina,
+        'siguiente': siguiente,
+        'es_primera_pagina': not request.GET.get('despues'),
+        'filtros': filtros.urlencode(),
         'categorias': categorias,
+        'estados': ESTADOS_INVENTARIO,
         'search_query': search_query,
-        'categoria_selected': categoria_filter
+        'categoria_selected': categoria_filter,
+        'estado_selected': estado_filter,
     }
-    
+
     return render(request, 'usuarios/inventario.html', context)
 
 
 @login_required
 def registrar_venta(request):
     ventas = Venta.objects.order_by('-fecha')
-    return render(request, 'usuarios/registrar_venta.html', {'ventas': ventas})
+    return render(request, 'usuarios/registrar_venta.html', {
+        'ventas': ventas,
+        'iva_tasa': tasa_iva(),
+    })
 
 @login_required
 def buscar_producto_por_codigo(request):
     codigo = request.GET.get('codigo', None)
-    data = {'error': 'Producto no encontrado.'}
-    if codigo:
-        try:
-            producto = Producto.objects.get(codigo=codigo)
-            data = {
-                'id': producto.id,
-                'nombre': producto.nombre,
-                'precio': producto.precio,
-                'stock': producto.stock,
-                'codigo': producto.codigo
-            }
-        except Producto.DoesNotExist:
-            pass
-    return JsonResponse(data)
+    contenido = indice.obtener(codigo) if codigo else None
+    if contenido is None:
+        return JsonResponse({'error': 'Producto no encontrado.'})
+    # El índice guarda el JSON ya serializado
+    return HttpResponse(contenido, content_type='application/json')
+
+
+@login_required
+def estadisticas_indice_codigos(request):
+    """Aciertos y fallos del índice de códigos de barras de este proceso."""
+    return JsonResponse(indice.estadisticas())
+
+
+@login_required
+def estadisticas_fragmentos(request):
+    """Aciertos y fallos de la caché de fragmentos de plantilla en este proceso."""
+    return JsonResponse(fragmentos.estadisticas.resumen())
+
+
+def metricas_prometheus(request):
+    """Histogramas por ruta de este proceso en formato Prometheus (solo local o staff)."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICAS_IPS and not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(metricas.registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @login_required
 def guardar_venta(request):
@@ -454,34 +578,12 @@ def guardar_venta(request):
         try:
             data = json.loads(request.body)
             productos = data.get('productos', [])
-            totales = data.get('totales', {})
-
-            # Crear la venta
-            venta = Venta.objects.create(
-                subtotal=totales.get('subtotal'),
-                iva=totales.get('iva'),
-                total=totales.get('total'),
-                cajero=request.user.username,
-                vendedor=request.user.username,
-                caja='1'  # Valor por defecto
-            )
 
-            # Crear los detalles y actualizar stock
-            for item in productos:
-                producto = get_object_or_404(Producto, id=item['id'])
-                cantidad = int(item['cantidad'])
-                
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=item['precio'],
-                    subtotal=item['subtotal']
-                )
-                
-                # Actualizar stock
-                producto.stock -= cantidad
-                producto.save()
+            # Registrar venta, detalles y stock en una sola transacción;
+            # los precios y totales se calculan en el servidor
+            venta = procesar_venta(productos, request.user)
+            # La factura se renderiza en segundo plano para que la impresión sea inmediata
+            transaction.on_commit(lambda: facturas_pdf.prerenderizar(venta.id))
 
             # Generar la URL del PDF para la respuesta
             pdf_url = reverse('generar_factura_pdf', args=[venta.id])
@@ -490,20 +592,58 @@ def guardar_venta(request):
             return JsonResponse({
                 'status': 'success',
                 'venta_id': venta.id,
-                'pdf_url': pdf_url
+                'pdf_url': pdf_url,
+                'totales': {
+                    'subtotal': venta.subtotal,
+                    'iva': venta.iva,
+                    'total': venta.total,
+                }
             })
 
+        except StockInsuficiente as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
 
 
+def _etag_catalogo(request):
+    try:
+        desde = catalogo.leer_fecha(request.GET.get('updated_since'))
+    except catalogo.ParametroInvalido:
+        return None
+    return catalogo.etag_pagina(request.GET.urlencode(), catalogo.version_catalogo(desde))
+
+
 @login_required
+@condition(etag_func=_etag_catalogo)
 def listar_todos_los_productos_api(request):
-    """Devuelve una lista de todos los productos para el modal de búsqueda."""
-    productos = Producto.objects.all().values('id', 'codigo', 'nombre', 'precio', 'stock')
-    return JsonResponse(list(productos), safe=False)
+    """
+    Catálogo paginado por cursor para el modal de búsqueda y la sincronización de las cajas.
+
+    Parámetros: `updated_since` (solo cambios desde esa fecha), `cursor` y `limite`.
+    """
+    fecha_servidor = timezone.now()
+    try:
+        desde = catalogo.leer_fecha(request.GET.get('updated_since'))
+        limite = catalogo.leer_limite(request.GET.get('limite'))
+        productos, cursor, eliminados = catalogo.pagina(desde, request.GET.get('cursor'), limite)
+    except catalogo.ParametroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    siguiente = None
+    if cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = cursor
+        siguiente = f"{request.path}?{parametros.urlencode()}"
+
+    return JsonResponse({
+        'productos': productos,
+        'eliminados': eliminados,
+        'siguiente': siguiente,
+        'fecha_servidor': fecha_servidor,
+    })
 
 
 @login_required
@@ -525,69 +665,63 @@ def get_product_details(request, producto_id):
 def buscar_productos(request):
     """Devuelve productos que coinciden con la búsqueda (para el autocompletado)."""
     termino = request.GET.get("q", "")
-    resultados = (
-        Producto.objects.filter(nombre__icontains=termino)
-        .order_by("nombre")[:10]
-    )
+    resultados = busqueda.buscar(Producto.objects.order_by("nombre"), termino)[:10]
     data = [{"id": p.id, "text": f"{p.nombre} — Stock: {p.stock}"} for p in resultados]
     return JsonResponse({"results": data})
 
 #/////////////////////////////////////////////////////////////////////////////////////////////
+FILAS_POR_PAGINA_REPORTES = 50
+
+
 @login_required
 def reportes(request):
-    ventas = Venta.objects.all()
     productos = Producto.objects.all()
     facturas = Factura.objects.all()
 
-    total_ventas = ventas.count()
-    total_facturado = sum(f.total for f in facturas)
+    # Indicadores leídos de los resúmenes precalculados (ver resumenes.py)
+    total_ventas = resumenes.total_ventas()
+    total_facturado = facturas.aggregate(total=Sum('total'))['total'] or 0
     stock_bajo = productos.filter(stock__lte=5)
 
     # Producto más vendido y menos vendido
-    producto_mas_vendido = DetalleVenta.objects.values('producto__nombre') \
-        .annotate(total_vendido=Sum('cantidad')) \
-        .order_by('-total_vendido') \
-        .first()
-
-    producto_menos_vendido = DetalleVenta.objects.values('producto__nombre') \
-        .annotate(total_vendido=Sum('cantidad')) \
-        .order_by('total_vendido') \
-        .first()
+    ranking_general = list(resumenes.ranking_productos())
+    producto_mas_vendido = ranking_general[0] if ranking_general else None
+    producto_menos_vendido = ranking_general[-1] if ranking_general else None
 
     # Filtro de mes y año
     mes = request.GET.get('mes')
     anio = request.GET.get('anio')
 
     ventas_filtradas = DetalleVenta.objects.all()
+    desde = hasta = None
 
     if mes and anio:  # Solo filtra si hay valores
         try:
-            mes = int(mes)
-            anio = int(anio)
-            inicio = datetime(anio, mes, 1)
-            # Calcula último día del mes
-            if mes == 12:
-                fin = datetime(anio + 1, 1, 1)
-            else:
-                fin = datetime(anio, mes + 1, 1)
+            desde, hasta = resumenes.rango_mes(int(anio), int(mes))
+            inicio = timezone.make_aware(datetime.combine(desde, datetime.min.time()))
+            fin = inicio + timedelta(days=(hasta - desde).days + 1)
             ventas_filtradas = ventas_filtradas.filter(venta__fecha__gte=inicio, venta__fecha__lt=fin)
         except ValueError:
             # En caso de que mes o año no sean números válidos, ignorar filtro
-            pass
+            desde = hasta = None
 
-# Preparar datos para la tabla
-    productos_vendidos = ventas_filtradas.annotate(
-        fecha_venta=F('venta__fecha'),
+    # Preparar datos para la tabla: una página por clave con las columnas ya unidas (sin N+1)
+    productos_vendidos = ventas_filtradas.values(
+        'id', 'venta__fecha', 'cantidad', 'precio_unitario', 'subtotal',
         nombre_producto=F('producto__nombre'),
-        precio_unitario_producto=F('precio_unitario'),
-        cantidad_vendida=F('cantidad'),
-        total_producto=F('subtotal')
-    ).order_by('-venta__fecha')
+    )
+    try:
+        pagina_ventas, siguiente = paginacion.paginar(
+            productos_vendidos, ['-venta__fecha', '-id'],
+            cursor=request.GET.get('despues'), limite=FILAS_POR_PAGINA_REPORTES,
+        )
+    except paginacion.CursorInvalido:
+        pagina_ventas, siguiente = paginacion.paginar(
+            productos_vendidos, ['-venta__fecha', '-id'], limite=FILAS_POR_PAGINA_REPORTES,
+        )
 
     # Datos para el gráfico de productos más vendidos
-    ranking = ventas_filtradas.values('producto__nombre').annotate(
-        total_vendido=Sum('cantidad')
-    ).order_by('-total_vendido')
+    ranking = ranking_general if desde is None else resumenes.ranking_productos(desde, hasta)
     productos_chart = [r['producto__nombre'] for r in ranking]
     cantidades_chart = [r['total_vendido'] for r in ranking]
 
@@ -597,7 +731,9 @@ def reportes(request):
 
 
     context = {
-        'ventas': ventas_filtradas,
+        'ventas': pagina_ventas,
+        'siguiente': siguiente,
+        'es_primera_pagina': not request.GET.get('despues'),
         'productos': productos,
         'facturas': facturas,
         'total_ventas': total_ventas,
@@ -666,91 +802,217 @@ def reportes_view(request):
 #////////////////////////////////////////////////////////////////////////
 
 
+@login_required
+@require_POST
 def reporte_pdf(request):
-    ventas = Venta.objects.all()
-    total_ventas = ventas.aggregate(Sum('total'))['total__sum'] or 0
+    """Encola el reporte PDF; lo genera `manage.py procesar_trabajos` (ver trabajos.py)."""
+    trabajo = trabajos.encolar(request.user, 'reporte_pdf')
+    return JsonResponse(_estado_trabajo(trabajo), status=202)
+
+
+def _estado_trabajo(trabajo):
+    return {
+        'trabajo_id': trabajo.id,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'estado_url': reverse('estado_trabajo', args=[trabajo.id]),
+        'descarga_url': reverse('descargar_trabajo', args=[trabajo.id]) if trabajo.estado == trabajos.TERMINADO else None,
+    }
 
-    productos = Producto.objects.annotate(
-        total_vendido=Sum('detalleventa__cantidad')
-    ).order_by('-total_vendido')
 
-    producto_mas_vendido = productos.first()
+@login_required
+def estado_trabajo(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoReporte, id=trabajo_id, usuario=request.user)
+    return JsonResponse(_estado_trabajo(trabajo))
 
-    template_path = 'usuarios/reportes_pdf.html'
-    context = {
-        'ventas': ventas,
-        'total_ventas': total_ventas,
-        'productos': productos,
-        'producto_mas_vendido': producto_mas_vendido,
-    }
 
-    template = get_template(template_path)
-    html = template.render(context)
+@login_required
+def descargar_trabajo(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoReporte, id=trabajo_id, usuario=request.user, estado=trabajos.TERMINADO)
+    try:
+        archivo = open(trabajo.archivo, 'rb')
+    except FileNotFoundError:
+        raise Http404("El archivo del reporte ya no existe")
+    return FileResponse(archivo, as_attachment=True, filename='reporte.pdf', content_type='application/pdf')
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="reporte.pdf"'
+#/////////////////////////////////////////////////////////////////////////
+def _filtros_exportacion(request):
+    """Lee desde/hasta (AAAA-MM-DD) o mes/anio, y producto, de la URL."""
+    desde = request.GET.get('desde')
+    hasta = request.GET.get('hasta')
+    mes = request.GET.get('mes')
+    anio = request.GET.get('anio')
+    producto = request.GET.get('producto')
 
-    pisa_status = pisa.CreatePDF(html, dest=response)
+    filtros = {}
+    if mes and anio:
+        filtros['desde'], filtros['hasta'] = resumenes.rango_mes(int(anio), int(mes))
+    else:
+        filtros['desde'] = date.fromisoformat(desde) if desde else None
+        filtros['hasta'] = date.fromisoformat(hasta) if hasta else None
+    filtros['producto_id'] = int(producto) if producto else None
+    return filtros
+
+
+def _respuesta_exportacion(formato, nombre, tipo, **filtros):
+    if formato == 'csv':
+        response = StreamingHttpResponse(
+            exportacion.csv_en_streaming(tipo, **filtros), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+        return response
+
+    return FileResponse(
+        exportacion.xlsx_en_archivo(tipo, **filtros),
+        as_attachment=True,
+        filename=f"{nombre}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def _exportar(request, formato):
+    tipo = request.GET.get('tipo', 'detalles')
+    if tipo not in ('ventas', 'detalles'):
+        return HttpResponseBadRequest("Tipo de exportación inválido.")
+    try:
+        filtros = _filtros_exportacion(request)
+    except ValueError:
+        return HttpResponseBadRequest("Filtros de fecha o producto inválidos.")
+
+    nombre = f"ventas_{tipo}"
+    if filtros['desde'] or filtros['hasta']:
+        nombre += f"_{filtros['desde'] or ''}_{filtros['hasta'] or ''}"
+    return _respuesta_exportacion(formato, nombre, tipo, **filtros)
+
+
+@login_required
+def reporte_csv(request):
+    return _exportar(request, 'csv')
 
-    if pisa_status.err:
-        return HttpResponse("Error al generar el PDF 🛑")
-    return response
 
-#/////////////////////////////////////////////////////////////////////////
 @login_required
 def reporte_excel(request):
-    ventas = Venta.objects.all().values()
-    df = pd.DataFrame(ventas)
-    response = HttpResponse(content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="reporte.xlsx"'
-    df.to_excel(response, index=False)
-    return response
+    return _exportar(request, 'xlsx')
 
 #/////////////////////////////////////////////////////////////////////////
 # Vista principal para gestionar proveedores
+FILAS_POR_PAGINA_PROVEEDORES = 100
+
+
 @login_required
 def proveedores(request):
     q = request.GET.get("q", "").strip()
 
-    # Buscar proveedores por nombre
-    proveedores = Proveedor.objects.filter(nombre__icontains=q)
-
     if request.method == "POST":
         proveedor_id = request.POST.get("id")
+        datos = {
+            "nombre": request.POST.get("nombre", "").strip(),
+            "telefono": request.POST.get("telefono", "").strip(),
+            "correo": request.POST.get("correo", "").strip() or None,
+            "direccion": request.POST.get("direccion", "").strip() or None,
+            "nit": request.POST.get("nit", "").strip(),
+        }
 
-        nombre = request.POST.get("nombre")
-        telefono = request.POST.get("telefono")
-        correo = request.POST.get("correo")
-        direccion = request.POST.get("direccion")
-        nit = request.POST.get("nit")
+        # Evitar NIT duplicado
+        duplicado = Proveedor.objects.filter(nit=datos["nit"])
+        if proveedor_id:
+            duplicado = duplicado.exclude(id=proveedor_id)
+        if duplicado.exists():
+            messages.error(request, f"⚠️ Ya existe un proveedor con el NIT {datos['nit']}.")
+            return redirect("proveedores")
 
         # EDITAR proveedor existente
         if proveedor_id:
-            proveedor = Proveedor.objects.get(id=proveedor_id)
-            proveedor.nombre = nombre
-            proveedor.telefono = telefono
-            proveedor.correo = correo
-            proveedor.direccion = direccion
-            proveedor.nit = nit
+            proveedor = get_object_or_404(Proveedor, id=proveedor_id)
+            for campo, valor in datos.items():
+                setattr(proveedor, campo, valor)
             proveedor.save()
 
         # CREAR nuevo proveedor
         else:
-            Proveedor.objects.create(
-                nombre=nombre,
-                telefono=telefono,
-                correo=correo,
-                direccion=direccion,
-                nit=nit,
-            )
+            Proveedor.objects.create(**datos)
 
         return redirect("proveedores")
 
+    # Buscar por prefijo del nombre o del NIT, una página por clave (nombre, id)
+    try:
+        pagina, siguiente = paginacion.paginar(
+            directorio.buscar(q), directorio.ORDEN, cursor=request.GET.get('despues'),
+            limite=FILAS_POR_PAGINA_PROVEEDORES,
+        )
+    except paginacion.CursorInvalido:
+        pagina, siguiente = paginacion.paginar(directorio.buscar(q), directorio.ORDEN, limite=FILAS_POR_PAGINA_PROVEEDORES)
+
+    # Parámetros actuales para el enlace de la página siguiente
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+
     return render(request, "usuarios/proveedores.html", {
-        "proveedores": proveedores,
+        "proveedores": pagina,
+        "siguiente": siguiente,
+        "es_primera_pagina": not request.GET.get('despues'),
+        "filtros": filtros.urlencode(),
         "q": q
     })
 
+
+@login_required
+def api_proveedores(request):
+    """
+    Directorio de proveedores paginado por cursor.
+
+    Parámetros: `q` (prefijo del nombre o del NIT), `cursor` y `limite`.
+    """
+    try:
+        limite = directorio.leer_limite(request.GET.get('limite'))
+        filas, cursor = directorio.pagina(request.GET.get('q', ''), request.GET.get('cursor'), limite)
+    except directorio.ParametroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    siguiente = None
+    if cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = cursor
+        siguiente = f"{request.path}?{parametros.urlencode()}"
+
+    return JsonResponse({'proveedores': filas, 'siguiente': siguiente})
+
+
+@login_required
+@require_POST
+def importar_proveedores(request):
+    """Carga masiva de proveedores por NIT desde CSV/XLSX (ver directorio.py)."""
+    archivo = request.FILES.get('archivo')
+    if not archivo:
+        messages.error(request, "⚠️ Selecciona un archivo .csv o .xlsx.")
+        return redirect('proveedores')
+
+    try:
+        resultado = directorio.importar(archivo, archivo.name)
+    except importacion.ArchivoInvalido as e:
+        messages.error(request, f"⚠️ {e}")
+        return redirect('proveedores')
+
+    messages.success(
+        request,
+        f"✅ Importación terminada: {resultado.creados} creados, {resultado.actualizados} actualizados.",
+    )
+    for error in resultado.errores[:MAXIMO_ERRORES_IMPORTACION]:
+        messages.error(request, f"⚠️ Fila {error.fila} ({error.codigo or 'sin NIT'}): {error.mensaje}")
+    if resultado.errores_totales > MAXIMO_ERRORES_IMPORTACION:
+        messages.error(request, f"⚠️ ... y {resultado.errores_totales - MAXIMO_ERRORES_IMPORTACION} filas más con errores.")
+    return redirect('proveedores')
+
+
+#/////////////////////////////////////////////////////////////////////////
+# Pedidos sugeridos por proveedor (precalculados con `calcular_sugerencias`)
+@login_required
+def sugerencias_compra(request):
+    return render(request, "usuarios/sugerencias_compra.html", {
+        "pedidos": reabastecimiento.pedidos_por_proveedor(),
+    })
+
 @login_required
 def eliminar_proveedor(request, proveedor_id):
     proveedor = get_object_or_404(Proveedor, id=proveedor_id)